@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# 10/18/26 GitStoph
+# Runs the scripts' searches end to end against mock_splunkd.py and times them.
+##################################################
+import os
+import sys
+import argparse
+import tempfile
+import time
+import tracemalloc
+from argparse import Namespace
+from contextlib import redirect_stdout
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(root)
+from mock_splunkd import MockSplunkd
+
+"""
+Starts the mock splunkd on a free port, points the scripts at it, and drives the same functions the scripts call:
+query_fw in checkfw.py, query_windhcp and query_padhcp in searchdhcp.py, and query_win_users in u2m.py, each
+followed by its dedupe and table output. Everything the scripts print goes to /dev/null. For each search it reports
+the best wall time of a few runs, rows/sec, REST calls per run, and the peak Python memory of one more run under
+tracemalloc, plus where the time went from splunkmetrics.
+The result cache, the local index and splunkdaemon.py are all kept out of the way, so every run does the whole
+dispatch, poll, fetch, parse, dedupe and render. The session key is cached in a temp dir like in a real run, so
+login only costs once.
+"""
+
+SCENARIOS = ['fw', 'fwshort', 'windhcp', 'padhcp', 'winuser']
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='End to end benchmark of the splunk scripts against a mock splunkd.')
+    parser.add_argument('-r', '--rows', required=False, type=int, default=5000, action='store', help='Rows every search returns.')
+    parser.add_argument('--duration', required=False, type=float, default=1.0, action='store', help='Seconds each mock job runs.')
+    parser.add_argument('--latency', required=False, type=float, default=0.005, action='store', help='Seconds added to every REST call.')
+    parser.add_argument('--queue-time', required=False, type=float, default=0.0, action='store', help='Seconds each mock job sits queued first.')
+    parser.add_argument('--slices', required=False, type=int, default=None, action='store', help='Pass --slices to every search.')
+    parser.add_argument('-n', '--repeat', required=False, type=int, default=3, action='store', help='Best of how many runs?')
+    parser.add_argument('scenarios', nargs='*', default=SCENARIOS, help='Which searches to run, out of {0}. Default is all of them.'.format(", ".join(SCENARIOS)))
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error("{0} isn't one of {1}.".format(name, ", ".join(SCENARIOS)))
+    return args
+
+
+def setup(mock):
+    """Points the scripts at the mock through the environment, before they're imported, since they read it at import
+    time. Values already in the environment win over the .env file, so the repo's own .env doesn't get in the way."""
+    scratch = tempfile.mkdtemp(prefix='splunkbench')
+    os.environ.update({'SPLUNKSCRIPTS_HOME': root, 'SPLUNK_HOST': '127.0.0.1', 'SPLUNK_PORT': str(mock.port),
+                       'SPLUNK_SCHEME': 'http', 'SPLUNK_USER': 'bench', 'SPLUNK_PASS': 'bench',
+                       'SPLUNK_SESSION_PATH': os.path.join(scratch, 'session'),
+                       'SPLUNK_CACHE_PATH': os.path.join(scratch, 'cache.sqlite'),
+                       'SPLUNK_INDEX_PATH': os.path.join(scratch, 'index.sqlite'),
+                       'SPLUNK_SCHED_DIR': os.path.join(scratch, 'scheduler'),
+                       'SPLUNK_DAEMON_SOCKET': os.path.join(scratch, 'none.sock')})
+
+
+def build_scenarios(slices):
+    """Returns the name and a no-argument function for every search, each doing what one run of the script would."""
+    import checkfw
+    import searchdhcp
+    import u2m
+    import splunkcache
+    splunkcache.disable()
+    service = checkfw.build_service()
+    checkfw.service = searchdhcp.service = u2m.service = service
+    searchdhcp.useindex = u2m.useindex = False
+    full = checkfw.build_search_query(Namespace(time='24h', output=None))
+    short = checkfw.build_search_query(Namespace(time='24h'))
+
+    def fw():
+        return checkfw.full_log_output(checkfw.dedupe_firewall_logs(checkfw.query_fw(*full, slices=slices, row_type=checkfw.FirewallRow)))
+
+    def fwshort():
+        return checkfw.short_log_output(checkfw.dedupe_firewall_logs(checkfw.query_fw(*short, slices=slices, row_type=checkfw.FirewallShortRow)))
+
+    def windhcp():
+        return searchdhcp.pretty_windows_output(searchdhcp.dedupe_windhcp_logs(searchdhcp.query_windhcp('host1', slices=slices)))
+
+    def padhcp():
+        return searchdhcp.pretty_pa_output(searchdhcp.dedupe_padhcp_logs(searchdhcp.query_padhcp('host1', slices=slices)))
+
+    def winuser():
+        return u2m.pretty_windows_output(u2m.dedupe_win_logs(u2m.query_win_users(['user1'], slices=slices)))
+
+    return {'fw': fw, 'fwshort': fwshort, 'windhcp': windhcp, 'padhcp': padhcp, 'winuser': winuser}
+
+
+def bench(name, run, mock, rows, repeat):
+    """Best of repeat runs for time, REST calls counted per run, then one more run under tracemalloc for memory."""
+    import splunkmetrics
+    best = None
+    for _ in range(repeat):
+        del splunkmetrics.phases[:]
+        calls = mock.calls['total']
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+            summary = splunkmetrics.summary()
+        calls = mock.calls['total'] - calls
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'name': name, 'seconds': best, 'rows_per_sec': rows / best if best else 0, 'calls': calls,
+            'peak_mb': peak / 1e6, 'summary': summary}
+
+
+def report(result):
+    print("{0:<10} {1:>9.3f}s  {2:>12,.0f} rows/sec  {3:>5} REST calls  {4:>8.1f} MB peak".format(
+        result['name'], result['seconds'], result['rows_per_sec'], result['calls'], result['peak_mb']))
+    phases = sorted(result['summary'].items(), key=lambda x: -x[1]['seconds'])
+    print("           " + "  ".join("{0} {1:.3f}s".format(name, total['seconds']) for name, total in phases))
+
+
+def main():
+    args = get_args()
+    mock = MockSplunkd(args.rows, args.duration, args.latency, args.queue_time).start()
+    setup(mock)
+    import splunkmetrics
+    splunkmetrics.enable()
+    print("Mock splunkd on port {0}: {1} rows per search, {2}s jobs, {3}s latency per call.".format(
+        mock.port, args.rows, args.duration, args.latency))
+    with open(os.devnull, 'w') as devnull:
+        with redirect_stdout(devnull):
+            scenarios = build_scenarios(args.slices)
+        for name in args.scenarios:
+            with redirect_stdout(devnull):
+                result = bench(name, scenarios[name], mock, args.rows, args.repeat)
+            report(result)
+    mock.stop()
+
+
+if __name__ == '__main__':
+    main()
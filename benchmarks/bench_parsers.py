@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# 10/18/26 GitStoph
+# Compares splunklib's XML ResultsReader against splunkjson on the same result set.
+##################################################
+import os
+import sys
+import io
+import argparse
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import splunklib.results as results
+from splunkjson import iter_json_results
+from payloads import fw_row, xml_payload, json_payload, json_export_payload
+
+"""
+By default this builds synthetic firewall payloads. To benchmark against real data, record the same search in both
+formats from a finished job and pass the files in, e.g.:
+    curl -k -u user https://splunk:8089/services/search/jobs/<sid>/results?count=0 > fw.xml
+    curl -k -u user "https://splunk:8089/services/search/jobs/<sid>/results?count=0&output_mode=json" > fw.json
+"""
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Splunk result parser benchmark.')
+    parser.add_argument('-r', '--rows', required=False, type=int, default=50000, action='store', help='How many synthetic rows?')
+    parser.add_argument('--xml', required=False, type=str, default=None, action='store', help='Recorded XML results payload.')
+    parser.add_argument('--json', required=False, type=str, default=None, action='store', help='Recorded JSON results payload.')
+    parser.add_argument('-n', '--repeat', required=False, type=int, default=3, action='store', help='Best of how many runs?')
+    args = parser.parse_args()
+    return args
+
+
+def parse_xml(payload):
+    return [x for x in results.ResultsReader(io.BytesIO(payload)) if isinstance(x, dict)]
+
+
+def parse_json(payload):
+    return list(iter_json_results(io.BytesIO(payload)))
+
+
+def parse_json_short(payload):
+    return list(iter_json_results(io.BytesIO(payload), fields=['_time', 'host', 'src_ip', 'dest_ip', 'dest_port', 'application', 'action']))
+
+
+def bench(name, parse, payload, repeat):
+    """Best of repeat runs, since the first one pays for warming caches."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = parse(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("{0:<24} {1:>8} rows  {2:>9.3f}s  {3:>12,.0f} rows/sec  {4:>8.1f} MB".format(
+        name, len(rows), best, len(rows) / best if best else 0, len(payload) / 1e6))
+    return best
+
+
+def main():
+    args = get_args()
+    if args.xml and args.json:
+        with open(args.xml, 'rb') as f:
+            xml = f.read()
+        with open(args.json, 'rb') as f:
+            jsn = f.read()
+        export = None
+    else:
+        rows = [fw_row(i) for i in range(args.rows)]
+        xml, jsn, export = xml_payload(rows), json_payload(rows), json_export_payload(rows)
+    xml_time = bench('xml ResultsReader', parse_xml, xml, args.repeat)
+    json_time = bench('json', parse_json, jsn, args.repeat)
+    bench('json, 7 fields', parse_json_short, jsn, args.repeat)
+    if export is not None:
+        bench('json export stream', parse_json, export, args.repeat)
+    print("json is {0:.1f}x faster than xml.".format(xml_time / json_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# 10/18/26 GitStoph
+# Local stand-in for splunkd, so the scripts can be run and timed without a live Splunk.
+##################################################
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+from payloads import fw_row, fw_summary_row, windhcp_row, padhcp_row, winuser_row, xml_row
+
+"""
+Serves the handful of splunkd endpoints the scripts use: auth/login, dispatching a job, polling it, finalize,
+results and results_preview in XML or JSON, and the export endpoint as a chunked stream. Each job pretends to run
+for duration seconds after queue_time seconds in the queue, and its result count grows with its progress, so the
+poll loop, early finalize and paging all get exercised. Every request waits latency seconds first, like a search
+head across a WAN. Which rows a job returns is guessed from the search string, and the time range is ignored. Every
+REST call is counted in calls, by method and path, so a benchmark can tell how chatty a search was.
+Run it on its own to point the scripts at it by hand, e.g. with SPLUNK_HOST=127.0.0.1 SPLUNK_PORT=18089
+SPLUNK_SCHEME=http in the environment.
+"""
+
+DATASETS = {'fwsummary': fw_summary_row, 'fw': fw_row, 'windhcp': windhcp_row, 'padhcp': padhcp_row,
+            'winuser': winuser_row}
+
+
+def dataset_for(search):
+    """Picks the kind of rows a search should get back."""
+    if '4624' in search:
+        return 'winuser'
+    if 'first_seen' in search:
+        return 'fwsummary'
+    if 'pan:system' in search:
+        return 'padhcp'
+    if 'ops_app_dhcp' in search:
+        return 'windhcp'
+    return 'fw'
+
+
+class MockJob(object):
+    def __init__(self, sid, search, rows, duration, queue_time):
+        self.sid = sid
+        self.search = search
+        self.kind = dataset_for(search)
+        self.rows = rows
+        self.duration = duration
+        self.queue_time = queue_time
+        self.created = time.monotonic()
+        self.finalized = False
+
+    def progress(self):
+        if self.finalized:
+            return 1.0
+        elapsed = time.monotonic() - self.created - self.queue_time
+        if self.duration <= 0:
+            return 1.0 if elapsed >= 0 else 0.0
+        return max(0.0, min(1.0, elapsed / self.duration))
+
+    def state(self):
+        if time.monotonic() - self.created < self.queue_time and not self.finalized:
+            return 'QUEUED'
+        return 'DONE' if self.progress() >= 1.0 else 'RUNNING'
+
+    def result_count(self):
+        return int(self.rows * self.progress())
+
+    def row(self, i):
+        return DATASETS[self.kind](i)
+
+
+class QuietServer(ThreadingHTTPServer):
+    """Doesn't print a traceback when a client hangs up mid request, which the scripts do on purpose when they stop
+    reading a stream early."""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+
+class MockSplunkd(object):
+    """The mock server. start() serves it from a background thread on port, or a free port if that's 0."""
+
+    def __init__(self, rows=1000, duration=1.0, latency=0.0, queue_time=0.0, port=0):
+        self.rows = rows
+        self.duration = duration
+        self.latency = latency
+        self.queue_time = queue_time
+        self.jobs = {}
+        self.calls = Counter()
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.next_sid = 1
+        self.server = QuietServer(('127.0.0.1', port), self.make_handler())
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def params(self):
+                parsed = urlparse(self.path)
+                qs = parse_qs(parsed.query)
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    qs.update(parse_qs(self.rfile.read(length).decode('utf-8')))
+                return parsed.path, dict((k, v[-1]) for k, v in qs.items())
+
+            def start(self, status):
+                self.send_response(status)
+                if self.headers.get('Connection', '').lower() == 'close':
+                    self.send_header('Connection', 'close')
+                    self.close_connection = True
+
+            def send(self, status, body, ctype='text/xml'):
+                body = body.encode('utf-8') if isinstance(body, str) else body
+                self.start(status)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self.route('GET')
+
+            def do_POST(self):
+                self.route('POST')
+
+            def route(self, method):
+                path, params = self.params()
+                if mock.latency:
+                    time.sleep(mock.latency)
+                parts = [p for p in path.split('/') if p]
+                if parts[:1] == ['servicesNS']:
+                    parts = ['services'] + parts[3:]
+                with mock.lock:
+                    mock.calls[method + ' ' + '/'.join(p if i < 3 else '*' for i, p in enumerate(parts[:5]))] += 1
+                    mock.calls['total'] += 1
+                    mock.connections.add(self.client_address)
+                if parts == ['services', 'auth', 'login']:
+                    return self.send(200, '<response><sessionKey>mocksession</sessionKey></response>')
+                if parts == ['services', 'search', 'jobs'] and method == 'POST':
+                    with mock.lock:
+                        sid = 'mock{0}'.format(mock.next_sid)
+                        mock.next_sid += 1
+                        mock.jobs[sid] = MockJob(sid, params.get('search', ''), mock.rows, mock.duration, mock.queue_time)
+                    return self.send(201, '<response><sid>{0}</sid></response>'.format(sid))
+                if parts == ['services', 'search', 'jobs', 'export']:
+                    job = MockJob('export', params.get('search', ''), mock.rows, 0, 0)
+                    return self.export(job, params)
+                if len(parts) >= 4 and parts[:3] == ['services', 'search', 'jobs']:
+                    job = mock.jobs.get(parts[3])
+                    if job is None:
+                        return self.send(404, '<response><messages><msg type="FATAL">Unknown sid.</msg></messages></response>')
+                    rest = parts[4:]
+                    if not rest:
+                        return self.send(200, self.entry(job))
+                    if rest == ['control']:
+                        if params.get('action') == 'finalize':
+                            job.finalized = True
+                        return self.send(200, '<response><messages><msg type="INFO">ok</msg></messages></response>')
+                    if rest in (['results'], ['results_preview']):
+                        return self.results(job, params)
+                return self.send(404, '<response/>')
+
+            def entry(self, job):
+                keys = {'dispatchState': job.state(), 'isDone': '1' if job.state() == 'DONE' else '0',
+                        'doneProgress': str(job.progress()), 'scanCount': str(job.result_count() * 10),
+                        'eventCount': str(job.result_count()), 'resultCount': str(job.result_count()),
+                        'runDuration': str(job.duration * job.progress()), 'sid': job.sid}
+                content = ''.join('<s:key name="{0}">{1}</s:key>'.format(k, escape(v)) for k, v in keys.items())
+                content += ('<s:key name="eai:acl"><s:dict><s:key name="owner">admin</s:key><s:key name="app">search</s:key>'
+                            '<s:key name="sharing">global</s:key></s:dict></s:key>')
+                return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<entry xmlns="http://www.w3.org/2005/Atom" xmlns:s="http://dev.splunk.com/ns/rest">'
+                        '<title>{0}</title><id>{1}</id><content type="text/xml"><s:dict>{2}</s:dict></content></entry>'
+                        ).format(escape(job.search), job.sid, content)
+
+            def rows(self, job, params, total):
+                offset = int(params.get('offset', 0))
+                count = int(params.get('count', 100))
+                end = total if count == 0 else min(total, offset + count)
+                return range(offset, end)
+
+            def results(self, job, params):
+                total = job.result_count()
+                rng = self.rows(job, params, total)
+                if params.get('output_mode') == 'json':
+                    body = json.dumps({'preview': False, 'init_offset': rng.start, 'messages': [],
+                                       'results': [job.row(i) for i in rng]})
+                    return self.send(200, body, 'application/json')
+                parts = ["<?xml version='1.0' encoding='UTF-8'?>\n<results preview='0'>\n<meta><fieldOrder></fieldOrder></meta>\n"]
+                for i in rng:
+                    parts.append(xml_row(i, job.row(i)))
+                parts.append('</results>\n')
+                return self.send(200, ''.join(parts))
+
+            def export(self, job, params):
+                self.start(200)
+                json_mode = params.get('output_mode') == 'json'
+                self.send_header('Content-Type', 'application/json' if json_mode else 'text/xml')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                def chunk(text):
+                    data = text.encode('utf-8')
+                    self.wfile.write('{0:x}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+
+                if not json_mode:
+                    chunk("<?xml version='1.0' encoding='UTF-8'?>\n<results preview='0'>\n<meta><fieldOrder></fieldOrder></meta>\n")
+                for i in range(mock.rows):
+                    row = job.row(i)
+                    if json_mode:
+                        chunk(json.dumps({'preview': False, 'offset': i, 'lastrow': i == mock.rows - 1 or None, 'result': row}) + '\n')
+                    else:
+                        chunk(xml_row(i, row))
+                if not json_mode:
+                    chunk('</results>\n')
+                self.wfile.write(b'0\r\n\r\n')
+
+        return Handler
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Local stand-in for splunkd.')
+    parser.add_argument('-p', '--port', required=False, type=int, default=18089, action='store', help='Port to listen on.')
+    parser.add_argument('-r', '--rows', required=False, type=int, default=1000, action='store', help='Rows every search returns.')
+    parser.add_argument('--duration', required=False, type=float, default=1.0, action='store', help='Seconds each job runs.')
+    parser.add_argument('--latency', required=False, type=float, default=0.0, action='store', help='Seconds added to every request.')
+    parser.add_argument('--queue-time', required=False, type=float, default=0.0, action='store', help='Seconds each job sits queued first.')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = get_args()
+    mock = MockSplunkd(args.rows, args.duration, args.latency, args.queue_time, args.port).start()
+    print("Mock splunkd listening on 127.0.0.1:{0}, Ctrl + C to stop.".format(mock.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# 10/18/26 GitStoph
+# Synthetic splunk result payloads for the benchmarks.
+##################################################
+import json
+import time
+import random
+from xml.sax.saxutils import escape
+
+"""
+Builds result streams that look like what splunkd sends back for the firewall search in checkfw.py, in both the XML
+and JSON layouts, so the parsers can be compared without a live Splunk. Rows are seeded by their offset, so the same
+row count always gives the same payload. mock_splunkd.py serves the same rows, plus DHCP, 4624 and flow summary rows
+for the other scripts. Those carry an epoch counting back from now, 30s apart, for the local index syncs.
+"""
+
+fw_fields = ['_time', 'host', 'src_zone', 'src_interface', 'src_ip', 'user', 'dest_zone', 'dest_interface',
+             'dest_ip', 'dest_port', 'transport', 'application', 'rule', 'action', 'bytes']
+
+
+def fw_row(i):
+    """One firewall deny row, shaped like the checkfw.py table output."""
+    r = random.Random(i)
+    return {'_time': '2026-10-18T{0:02d}:{1:02d}:{2:02d}.000+00:00'.format(23 - (i // 3600) % 24, 59 - (i // 60) % 60, 59 - i % 60),
+            'host': 'pa-fw0{0}'.format(r.randint(1, 4)), 'src_zone': 'trust', 'src_interface': 'ethernet1/1',
+            'src_ip': '10.0.{0}.{1}'.format(r.randint(0, 3), r.randint(1, 254)), 'user': 'corp\\user{0}'.format(r.randint(1, 50)),
+            'dest_zone': 'untrust', 'dest_interface': 'ethernet1/2', 'dest_ip': '8.8.{0}.{1}'.format(r.randint(0, 3), r.randint(1, 9)),
+            'dest_port': str(r.choice([53, 443, 80, 22])), 'transport': 'tcp', 'application': r.choice(['dns', 'ssl', 'web-browsing']),
+            'rule': 'deny-all', 'action': 'blocked', 'bytes': str(r.randint(60, 9000))}
+
+
+def fw_summary_row(i):
+    """One flow summary row, shaped like the checkfw.py --summary, --tstats and batch searches return."""
+    r = fw_row(i)
+    now = int(time.time())
+    return {'src_ip': r['src_ip'], 'dest_ip': r['dest_ip'], 'dest_port': r['dest_port'], 'application': r['application'],
+            'rule': r['rule'], 'action': r['action'], 'count': str(i % 7 + 1), 'bytes': r['bytes'],
+            'first_seen': str(now - i * 30 - 3600), 'last_seen': str(now - i * 30)}
+
+
+def windhcp_row(i):
+    """One Windows DHCP row, shaped like the searchdhcp.py table output."""
+    r = random.Random(i)
+    mac = ''.join(r.choice('0123456789ABCDEF') for _ in range(12))
+    return {'date': '10/18/26', 'time': '12:00:{0:02d}'.format(i % 60), 'description': 'Renew',
+            'dest': 'host{0}.corp.local'.format(i % 500), 'dest_ip': '10.1.{0}.{1}'.format(i % 200, i % 250 + 1),
+            'mac': mac, 'signature': 'Renew', 'host': 'dhcp01', 'epoch': str(int(time.time()) - i * 30)}
+
+
+def padhcp_row(i):
+    """One PA DHCP system log row, shaped like the searchdhcp.py table output."""
+    r = random.Random(i)
+    mac = ':'.join(''.join(r.choice('0123456789abcdef') for _ in range(2)) for _ in range(6))
+    return {'generated_time': '2026/10/18 12:00:{0:02d}'.format(i % 60), 'dvc_name': 'pa-fw01',
+            'description': 'DHCP lease started ip 10.2.0.{0} --> mac {1} - hostname host{2}'.format(i % 250, mac, i % 500),
+            'epoch': str(int(time.time()) - i * 30)}
+
+
+def winuser_row(i):
+    """One 4624 row, shaped like the u2m.py stats output and its map sync."""
+    now = int(time.time())
+    return {'host': 'WS{0:04d}'.format(i % 40), 'EventCode': '4624', 'user': 'user{0}'.format(i % 60),
+            'epoch': str(now - i * 30), 'first_seen': str(now - i * 30 - 3600), 'last_seen': str(now - i * 30)}
+
+
+def xml_row(i, row):
+    """One <result> element the way splunkd writes it."""
+    fields = ''.join("<field k='{0}'><value><text>{1}</text></value></field>".format(k, escape(v)) for k, v in row.items())
+    return "<result offset='{0}'>{1}</result>\n".format(i, fields)
+
+
+def xml_header(fields):
+    return ("<?xml version='1.0' encoding='UTF-8'?>\n<results preview='0'>\n<meta><fieldOrder>{0}</fieldOrder></meta>\n"
+            .format(''.join('<field>{0}</field>'.format(f) for f in fields)))
+
+
+def xml_payload(rows, fields=fw_fields):
+    """A complete XML results document, as bytes."""
+    parts = [xml_header(fields)]
+    parts.extend(xml_row(i, row) for i, row in enumerate(rows))
+    parts.append('</results>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def json_payload(rows, fields=fw_fields):
+    """A complete output_mode=json results document, as bytes."""
+    return json.dumps({'preview': False, 'init_offset': 0, 'messages': [],
+                       'fields': [{'name': f} for f in fields], 'results': rows}).encode('utf-8')
+
+
+def json_export_payload(rows):
+    """An output_mode=json export stream, one object per line, as bytes."""
+    return ''.join(json.dumps({'preview': False, 'offset': i, 'result': row}) + '\n' for i, row in enumerate(rows)).encode('utf-8')
@@ -4,42 +4,89 @@
 ##################################################
 import sys
 import os
-from time import sleep
-import splunklib.results as results
-import splunklib.client as client
 from dotenv import load_dotenv
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from rich.console import Console
 from rich.table import Table
+from time import strftime, localtime, sleep
 
 """
 This script was intended to be run from the bin, so it needs to add the /opt/splunkscripts directory to path
-to access all the libraries it needs, as well as the .env configuration file. Please note this is an example,
-and not necessarily how secure credentials should be handled.
+to access all the libraries it needs, as well as the .env configuration file. Set SPLUNKSCRIPTS_HOME to use a
+different directory. Please note this is an example, and not necessarily how secure credentials should be handled.
 """
 
 console = Console()
-os.chdir('/opt/splunkscripts')
+os.chdir(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'))
 current_dir = os.getcwd()
 sys.path.append(current_dir)
 fpath = os.getcwd()
 load_dotenv(os.path.join(fpath, '.env'))
+from splunkjobs import run_search, run_sliced_search, iter_sliced_search, stream_search, spl_head
+import splunkcache
+import splunkdaemon
+import splunkmetrics
+import splunkscheduler
+from splunkdedupe import dedupe, iter_dedupe, spl_dedup
+from splunkrows import record_type
+from splunkoutput import FORMATS, RowWriter, take_stdout
+from splunkquery import is_ipaddress, any_term, ip_filter, user_filter
 global timeoptions
 timeoptions = ['15m', '30m', '1h', '4h', '8h', '12h', '16h', '24h']
+logkeys = ['_time', 'host', 'src_zone', 'src_interface', 'src_ip', 'user',
+    'dest_zone', 'dest_interface', 'dest_ip', 'dest_port', 'transport', 'application',
+    'rule', 'action', 'bytes']
+shortkeys = ['_time', 'host', 'src_ip', 'dest_ip', 'dest_port', 'application', 'action']
+dedupekeys = ['application', 'dest_ip', 'dest_port', 'src_ip']
+summarykeys = ['src_ip', 'dest_ip', 'dest_port', 'application', 'rule', 'action']
+datamodel = os.getenv('SPLUNK_FW_DATAMODEL', 'Network_Traffic.All_Traffic')
+datamodelfields = dict(x.split('=') for x in os.getenv('SPLUNK_FW_DATAMODEL_FIELDS',
+    'src_ip=src_ip,dest_ip=dest_ip,dest_port=dest_port,application=app,rule=rule,action=action,user=user,bytes=bytes').split(','))
+internkeys = ['host', 'src_zone', 'src_interface', 'dest_zone', 'dest_interface', 'dest_port', 'transport',
+    'application', 'rule', 'action']
+FirewallRow = record_type('FirewallRow', logkeys, interned=internkeys)
+FirewallShortRow = record_type('FirewallShortRow', shortkeys, interned=internkeys)
+outputformat = 'table'
+followbackfill = os.getenv('SPLUNK_FOLLOW_BACKFILL', '1m')
+followkeys = int(os.getenv('SPLUNK_FOLLOW_DEDUPE_KEYS', '100000'))
+followretry = float(os.getenv('SPLUNK_FOLLOW_RETRY', '5'))
+batchsize = int(os.getenv('SPLUNK_BATCH_SIZE', '250'))
+batchjobs = int(os.getenv('SPLUNK_BATCH_JOBS', '4'))
 
 def get_args():
     parser = argparse.ArgumentParser(
         description='Splunk firewall log search tool. Be smart with your args, or face a mile of output. Script will *attempt* to dedupe output. Use the "-o" flag to print the output you should include in a netadmin ticket.')
     parser.add_argument('-a', '--action',required=False,type=str, default=argparse.SUPPRESS,
         nargs='?', help="OPTIONAL: 'allowed' is the only acceptable arg. Scripts default to anything but allowed. ")
+    parser.add_argument('-b', '--batch-file',required=False,type=str, default=argparse.SUPPRESS,
+        nargs='?', help="OPTIONAL: File of IPs to check, one per line. Each IP is matched as a source or destination, and hits are summarized per IP.")
     parser.add_argument('-d', '--dest',required=False,type=str, default=argparse.SUPPRESS,
-        nargs='?', help="OPTIONAL: Destination IP for the query?")
+        nargs='?', help="OPTIONAL: Destination IP or CIDR for the query?")
+    parser.add_argument('-l', '--limit',required=False,type=int, default=argparse.SUPPRESS,
+        help="OPTIONAL: Stop after this many results. The search is finalized early once it has them.")
+    parser.add_argument('-f', '--format',required=False,type=str, default='table', choices=FORMATS,
+        help="OPTIONAL: 'table' draws the usual table. 'csv', 'tsv' and 'jsonl' write plain rows to stdout instead, much faster for big results and for piping into other tools.")
+    parser.add_argument('--follow',required=False,type=str, default=argparse.SUPPRESS,
+        nargs='?', help="OPTIONAL: Keep watching. Runs a real-time search and prints new flows as they're indexed until Ctrl + C. -t is ignored.")
+    parser.add_argument('--metrics',required=False,type=str, default=argparse.SUPPRESS,
+        nargs='?', const='-', help="OPTIONAL: Time each phase of the run and print the timings and job stats as JSON to stderr, or append them to the given file.")
+    parser.add_argument('--no-cache',required=False,type=str, default=argparse.SUPPRESS,
+        nargs='?', help="OPTIONAL: Skip the local result cache and run a fresh search.")
     parser.add_argument('-o', '--output',required=False,type=str, default=argparse.SUPPRESS,
         nargs='?', help="OPTIONAL: Pass this arg to view the full output for a ticket.")
     parser.add_argument('-s', '--source',required=False,type=str, default=argparse.SUPPRESS,
-        nargs='?', help="OPTIONAL: Source IP for the query?")
+        nargs='?', help="OPTIONAL: Source IP or CIDR for the query?")
+    parser.add_argument('--summary',required=False,type=str, default=argparse.SUPPRESS,
+        nargs='?', help="OPTIONAL: Have Splunk count the flows instead of sending every event. Prints one row per flow with its count, bytes and first/last seen. -o is ignored.")
     parser.add_argument('-t', '--time',required=False,type=str, default='30m',action='store',
         help="OPTIONAL: How far back should we look? Default is '30m'. Max is '24h'. Options are: {0}".format(str(timeoptions)))
+    parser.add_argument('--slices',required=False,type=int, default=argparse.SUPPRESS,
+        help="OPTIONAL: Split the time window into this many slices and search them in parallel, newest first. Helps on long windows.")
+    parser.add_argument('--stream',required=False,type=str, default=argparse.SUPPRESS,
+        nargs='?', help="OPTIONAL: Print rows as Splunk returns them instead of waiting for the whole search. Best for big searches.")
+    parser.add_argument('--tstats',required=False,type=str, default=argparse.SUPPRESS,
+        nargs='?', help="OPTIONAL: Count flows with tstats over the accelerated firewall data model instead of reading raw events. Much faster on long windows. Ignored with -o.")
     parser.add_argument('-u', '--user',required=False,type=str, default=argparse.SUPPRESS,
         nargs='?', help='OPTIONAL: Scope results to a user?')
     args = parser.parse_args()
@@ -54,7 +101,69 @@ def build_search_query(args):
     If destination info is passed, it updates the query with it.
     If source ip info is passed, it updates the query with it.
     If a username is passed, it updates the query with it.
-    Finally it tells the output to return as a table, which returns a clean dict for the script to use."""
+    Duplicate flows are deduped on the search head, so they never come over the wire.
+    Finally it tells the output to return as a table of just the fields the chosen output shows, which returns a clean dict for the script to use.
+    With --summary, the search head counts the flows instead and returns one row per flow, busiest first, in the same
+    shape as the tstats search. Sliced summaries are merged client side, so the head is left to merge_summary_rows."""
+    query, kwargs_normalsearch = build_base_query(args)
+    query += build_ip_filters(args)
+    if 'summary' in args:
+        query += "| stats count sum(bytes) as bytes min(_time) as first_seen max(_time) as last_seen by {0} ".format(" ".join(summarykeys))
+        query += "| sort 0 - count "
+    else:
+        query += spl_dedup(dedupekeys)
+        query += "| table {0} ".format(" ".join(logkeys if 'output' in args else shortkeys))
+    if 'limit' in args and not ('summary' in args and 'slices' in args):
+        query += spl_head(args.limit)
+    console.log("[green]Query to be used: {0}.".format(query))
+    return query, kwargs_normalsearch
+
+
+def build_follow_query(args):
+    """Builds the real-time search for --follow. Same filters and table as build_search_query, but without the dedup
+    and head, since a real-time search never finishes. Dedupe happens client side instead, see iter_follow_dedupe.
+    The search starts followbackfill ago, so whatever was indexed just before it started still shows up."""
+    query = build_base_query(args)[0]
+    query += build_ip_filters(args)
+    query += "| table {0} ".format(" ".join(logkeys if 'output' in args else shortkeys))
+    kwargs_rtsearch = {'search_mode': 'realtime', 'earliest_time': "rt-{0}".format(followbackfill), 'latest_time': 'rt'}
+    console.log("[green]Query to be used: {0}.".format(query))
+    return query, kwargs_rtsearch
+
+
+def build_tstats_query(args):
+    """Builds a tstats search over the accelerated firewall data model. Instead of scanning every raw event in the window,
+    this reads the data model summaries and returns one row per distinct flow, with its count, bytes and first/last
+    seen times. The data model name and the mapping from our field names to the data model's come from the .env file,
+    and default to the CIM Network_Traffic model. Raw events are still needed for the full -o output, so this is only
+    used for the short output."""
+    node = datamodel.split('.')[-1]
+    def dm(field):
+        return "{0}.{1}".format(node, datamodelfields.get(field, field))
+    kwargs_normalsearch = build_base_query(args)[1]
+    query = "| tstats summariesonly=true count sum({0}) as bytes min(_time) as first_seen max(_time) as last_seen from datamodel={1} where index=sec_net_firewall ".format(dm('bytes'), datamodel)
+    if 'action' in args and args.action == 'allowed':
+        query += "{0}=allowed ".format(dm('action'))
+    else:
+        query += "{0}!=allowed ".format(dm('action'))
+    if 'dest' in args:
+        query += "{0}={1} ".format(dm('dest_ip'), args.dest)
+    if 'source' in args:
+        query += "{0}={1} ".format(dm('src_ip'), args.source)
+    if 'user' in args:
+        query += "{0}=*{1} ".format(dm('user'), args.user)
+    query += "by {0} ".format(" ".join(dm(x) for x in summarykeys))
+    query += "| rename {0} ".format(", ".join("{0} as {1}".format(dm(x), x) for x in summarykeys))
+    query += "| sort 0 - count "
+    if 'limit' in args:
+        query += spl_head(args.limit)
+    console.log("[green]Query to be used: {0}.".format(query))
+    return query, kwargs_normalsearch
+
+
+def build_base_query(args):
+    """Builds the part of the query every search shares: the index, the time window, the action and the user. Returns the
+    query so far and the search kwargs."""
     query = 'search index=sec_net_firewall '
     if 'time' in args:
         if args.time in timeoptions:
@@ -73,71 +182,199 @@ def build_search_query(args):
             query += "action!=allowed "
     else:
         query += "action!=allowed "
-    if 'dest' in args:
-        query += "dest_ip={0} ".format(args.dest)
-    if 'source' in args:
-        query += "src_ip={0} ".format(args.source)
     if 'user' in args:
-        query += "user=*{0} ".format(args.user)
-    query += "| table _time host src_zone src_interface src_ip user dest_zone dest_interface dest_ip dest_port transport application rule action bytes"
-    console.log("[green]Query to be used: {0}.".format(query))
+        query += user_filter('user', args.user)[0]
     return query, kwargs_normalsearch
 
 
+def build_ip_filters(args):
+    """The source and destination part of the query. IPs are looked up as TERM()s so splunk can skip the buckets that
+    don't have them, and CIDRs are narrowed the same way, then matched exactly with cidrmatch right after the search.
+    See splunkquery.py."""
+    base = post = ""
+    for field, arg in (('dest_ip', 'dest'), ('src_ip', 'source')):
+        if arg in args:
+            ipbase, ippost = ip_filter(field, getattr(args, arg))
+            base += ipbase
+            post += ippost
+    return base + post
+
+
+def read_batch_file(path):
+    """Reads indicators from a file, one per line. Blank lines, # comments and repeats are skipped."""
+    indicators = []
+    seen = set()
+    with open(path) as f:
+        for line in f:
+            indicator = line.split('#')[0].strip()
+            if indicator and indicator not in seen:
+                seen.add(indicator)
+                indicators.append(indicator)
+    return indicators
+
+
+def build_batch_queries(args, indicators):
+    """Splits the indicators into chunks of batchsize and builds one search per chunk. Each search matches its chunk as
+    either the source or the destination and has splunk count the hits per src/dest pair, so only one small row per
+    pair comes back instead of every event."""
+    base, kwargs_normalsearch = build_base_query(args)
+    queries = []
+    for i in range(0, len(indicators), batchsize):
+        chunk = indicators[i:i+batchsize]
+        values = ", ".join('"{0}"'.format(x) for x in chunk)
+        query = base + (any_term(chunk) if all(is_ipaddress(x) for x in chunk) else "")
+        query += "(src_ip IN ({0}) OR dest_ip IN ({0})) ".format(values)
+        query += "| stats count earliest(_time) as first_seen latest(_time) as last_seen by src_ip dest_ip"
+        queries.append((chunk, query))
+    console.log("[green]{0} indicators split into {1} searches of up to {2}. Example query: {3}".format(
+        len(indicators), len(queries), batchsize, base + "(src_ip IN (...) OR dest_ip IN (...)) | stats ..."))
+    return queries, kwargs_normalsearch
+
+
+def query_batch(queries, kwargsearch):
+    """Runs the batch searches, batchjobs at a time, and folds the src/dest pair counts back into hits per indicator.
+    Returns a dict of indicator to {'hits', 'first_seen', 'last_seen', 'peers'}."""
+    console.log("[yellow]Searching firewall logs for {0} batches..".format(len(queries)))
+    hits = {}
+    with ThreadPoolExecutor(max_workers=batchjobs) as pool:
+        futures = {}
+        for n, (chunk, query) in enumerate(queries):
+            label = "batch {0}/{1}".format(n + 1, len(queries))
+            futures[pool.submit(run_search, service, query, kwargsearch, "[yellow][!] {0} completed!\n".format(label), label)] = set(chunk)
+        for future in as_completed(futures):
+            chunk = futures[future]
+            for row in future.result():
+                for side, other in (('src_ip', 'dest_ip'), ('dest_ip', 'src_ip')):
+                    indicator = row.get(side)
+                    if indicator not in chunk:
+                        continue
+                    hit = hits.setdefault(indicator, {'hits': 0, 'first_seen': None, 'last_seen': None, 'peers': set()})
+                    hit['hits'] += int(row.get('count', 0))
+                    first, last = float(row.get('first_seen', 0)), float(row.get('last_seen', 0))
+                    hit['first_seen'] = first if hit['first_seen'] is None else min(first, hit['first_seen'])
+                    hit['last_seen'] = last if hit['last_seen'] is None else max(last, hit['last_seen'])
+                    hit['peers'].add(row.get(other))
+    return hits
+
+
 def build_service():
-    """Builds the service object using the client function after grabbing the necessary fields from a .env file."""
-    service = client.connect(host=os.getenv('SPLUNK_HOST'),
-                            port=os.getenv('SPLUNK_PORT'),
-                            scheme=os.getenv('SPLUNK_SCHEME'),
-                            username=os.getenv('SPLUNK_USER'),
-                            password=os.getenv('SPLUNK_PASS'))
-    return service
+    """Builds the service object after grabbing the necessary fields from a .env file. The session key is reused between
+    runs and every REST call shares a pool of keep-alive connections, see splunksession.py.
+    If splunkdaemon.py is running, the searches are handed to it instead, and splunklib never gets imported here."""
+    service = splunkdaemon.connect()
+    if service is not None:
+        return service
+    import splunksession
+    return splunksession.build_service()
 
 
-def query_fw(query, kwargsearch):
+def query_fw(query, kwargsearch, fields=None, limit=None, slices=None, row_type=FirewallRow):
     """Uses the format_mac_windhcp to create a potential MAC to search which gets plugged into the searchquery_normal format line. The rest of the line is formatted with the original
     query string in case it wasn't a MAC address originally passed. kwargs are added to do a normal search over the last 72hours. Stats are printed out to the console.log to let the
-    user know the status of their search. Logs are then extracted from the job and returned."""
+    user know the status of their search. Logs are then extracted from the job and returned.
+    Rows are parsed straight into row_type records holding only that output's fields. Pass row_type=None for plain dicts."""
     console.log("[yellow]Searching firewall logs..")
-    job = service.jobs.create(query, **kwargsearch)
-    # A normal search returns the job's SID right away, so we need to poll for completion
+    return run_sliced_search(service, query, kwargsearch, slices, done_message="[yellow][!] Search Completed!\n", fields=fields, limit=limit, row_type=row_type)
+
+
+def stream_fw(query, kwargsearch, limit=None, slices=None, row_type=FirewallRow):
+    """Same search as query_fw, but run over the export endpoint. Returns a generator that yields rows as they arrive.
+    With slices, the window is searched as that many parallel jobs instead, and each slice's rows are yielded as soon
+    as it and every newer slice are done."""
+    console.log("[yellow]Streaming firewall logs..")
+    if slices and slices > 1:
+        return iter_sliced_search(service, query, kwargsearch, slices, limit=limit, row_type=row_type)
+    return stream_search(service, query, kwargsearch, limit=limit, row_type=row_type)
+
+
+def follow_fw(query, kwargsearch, row_type=FirewallShortRow):
+    """Runs the real-time search over the export endpoint and yields rows as they come in, until Ctrl + C. Real-time
+    results only ever arrive as previews, so those are kept. If the connection drops or splunk ends the search, it
+    reconnects after followretry seconds, and the backfill window covers the gap. After five failures in a row
+    without a single row in between, it gives up."""
+    console.log("[yellow]Following firewall logs, Ctrl + C to stop..")
+    failures = 0
     while True:
-        while not job.is_ready():
-            pass
-        stats = {"isDone": job["isDone"],
-                 "doneProgress": float(job["doneProgress"])*100,
-                  "scanCount": int(job["scanCount"]),
-                  "eventCount": int(job["eventCount"]),
-                  "resultCount": int(job["resultCount"])}
-        console.log(f"[purple]{stats['doneProgress']}%   [blue]{stats['scanCount']} scanned   [yellow]{stats['eventCount']} matched   [green]{stats['resultCount']} results")
-        if stats["isDone"] == "1":
-            console.log("[yellow][!] Search Completed!\n")
-            break
-        sleep(1)
-    logs = [x for x in results.ResultsReader(job.results())]
-    job.cancel()
-    return logs
+        try:
+            for row in stream_search(service, query, kwargsearch, row_type=row_type, previews=True):
+                failures = 0
+                yield row
+            console.log("[yellow]Real-time search ended, reconnecting in {0}s..".format(followretry))
+        except Exception as error:
+            failures += 1
+            if failures >= 5:
+                raise
+            console.log("[red]Real-time search dropped ({0}), reconnecting in {1}s..".format(error, followretry))
+        sleep(followretry)
+
+
+@splunkmetrics.timed('dedupe')
+def merge_summary_rows(logs, limit=None):
+    """Adds up summary rows for the same flow, which a sliced summary returns once per slice: counts and bytes are
+    summed, first_seen and last_seen widened. Returns the flows busiest first, cut to limit."""
+    flows = {}
+    for u in logs:
+        key = tuple(u.get(x) for x in summarykeys)
+        flow = flows.get(key)
+        if flow is None:
+            flows[key] = dict(u)
+            continue
+        for field in ('count', 'bytes'):
+            if field in u:
+                flow[field] = str(int(float(flow.get(field, 0))) + int(float(u[field])))
+        if 'first_seen' in u:
+            flow['first_seen'] = min(flow.get('first_seen', u['first_seen']), u['first_seen'], key=float)
+        if 'last_seen' in u:
+            flow['last_seen'] = max(flow.get('last_seen', u['last_seen']), u['last_seen'], key=float)
+    merged = sorted(flows.values(), key=lambda u: -int(float(u.get('count', 0))))
+    return merged[:limit] if limit else merged
+
 
+def iter_follow_dedupe(logs):
+    """Same key fields as dedupe_firewall_logs, but only the followkeys most recently seen keys are remembered, so
+    memory stays flat however long --follow runs. A flow that's been quiet long enough to be forgotten shows up
+    again the next time it's seen."""
+    return iter_dedupe(logs, dedupekeys, max_keys=followkeys)
 
+
+def iter_dedupe_firewall_logs(logs):
+    """Dedupes by application, dest_ip, dest_port, and src_ip fields. Yields each row the first time its
+    key is seen, so it works on a live stream as well as a list. """
+    return iter_dedupe(logs, dedupekeys)
+
+
+@splunkmetrics.timed('dedupe')
 def dedupe_firewall_logs(logs):
-    """Dedupes by concatenating application, dest_ip, dest_port, and src_ip fields. """
-    macs = set()
-    nodupes = []
-    for x in logs:
-        z = tuple(sorted(x.items()))
-        y = z[2]+z[5]+z[6]+z[12]
-        if y not in macs:
-            macs.add(y)
-            nodupes.append(x)
-    return nodupes
+    """Dedupes by application, dest_ip, dest_port, and src_ip fields. """
+    return dedupe(logs, dedupekeys)
+
+
+def plain_output(logs, keys, live=False):
+    """Writes the rows to stdout in the --format that was picked instead of drawing a table. Works on a list or a
+    live stream alike, and with live set each row is flushed the moment it's written."""
+    writer = RowWriter(outputformat, keys, live=live)
+    count = writer.write(logs)
+    writer.close()
+    if count == 0:
+        console.log("[red]No firewall logs located.")
+
+
+def render_row(u, keys):
+    """The row's values for keys as display strings. Missing fields become 'Missing.' and _time loses its
+    fractional seconds. The row itself is left alone."""
+    values = [u.get(key, 'Missing.') for key in keys]
+    if keys[0] == '_time':
+        values[0] = values[0].split('.')[0]
+    return values
 
 
+@splunkmetrics.timed('render')
 def full_log_output(logs):
     """Builds the rich table, adds the columns, adds the rows, then prints it nicely in green.
-    This option prints the full results of the splunk table. I hope your console is wide."""
-    logkeys = ['_time', 'host', 'src_zone', 'src_interface', 'src_ip', 'user',
-    'dest_zone', 'dest_interface', 'dest_ip', 'dest_port', 'transport', 'application',
-    'rule', 'action', 'bytes']
+    This option prints the full results of the splunk table. I hope your console is wide.
+    Fields a row doesn't have are shown as 'Missing.'."""
+    if outputformat != 'table':
+        return plain_output(logs, logkeys)
     if len(logs) != 0:
         try:
             table = Table(show_header=True, header_style="cyan", show_lines=True)
@@ -157,14 +394,7 @@ def full_log_output(logs):
             table.add_column("action", justify="center")
             table.add_column("bytes", justify="center")
             for u in logs:
-                for key in logkeys:
-                    if key not in u.keys():
-                        u[key] = 'Missing.'
-            for u in logs:
-                table.add_row(u['_time'].split('.')[0], u['host'],
-                u['src_zone'], u['src_interface'], u['src_ip'], u['user'], u['dest_zone'],
-                u['dest_interface'], u['dest_ip'], u['dest_port'], u['transport'],
-                u['application'], u['rule'], u['action'], u['bytes'])
+                table.add_row(*render_row(u, logkeys))
             console.print(table, style='green')
             print("\n")
         except:
@@ -174,12 +404,13 @@ def full_log_output(logs):
         console.log("[red]No firewall logs located.")
 
 
+@splunkmetrics.timed('render')
 def short_log_output(logs):
     """Builds the rich table, adds the columns, adds the rows, then prints it nicely in green.
-    This option prints an abbreviated output of the table with more basic info."""
-    logkeys = ['_time', 'host', 'src_zone', 'src_interface', 'src_ip', 'user',
-    'dest_zone', 'dest_interface', 'dest_ip', 'dest_port', 'transport', 'application',
-    'rule', 'action', 'bytes']
+    This option prints an abbreviated output of the table with more basic info.
+    Fields a row doesn't have are shown as 'Missing.'."""
+    if outputformat != 'table':
+        return plain_output(logs, shortkeys)
     if len(logs) != 0:
         try:
             table = Table(show_header=True, header_style="cyan", show_lines=True)
@@ -191,12 +422,48 @@ def short_log_output(logs):
             table.add_column("application", justify="center")
             table.add_column("action", justify="center")
             for u in logs:
-                for key in logkeys:
-                    if key not in u.keys():
-                        u[key] = 'Missing.'
+                table.add_row(*render_row(u, shortkeys))
+            console.print(table, style='green')
+            print("\n")
+        except:
+            console.print("[!] Error: ", sys.exc_info(), style='bold red')
+            pass
+    else:
+        console.log("[red]No firewall logs located.")
+
+
+@splunkmetrics.timed('stream')
+def stream_log_output(logs, keys):
+    """Prints a header, then each row on its own line as soon as it comes off the stream. A rich table can't be drawn
+    until every row is known, so this trades the pretty borders for time to first row."""
+    if outputformat != 'table':
+        return plain_output(logs, keys, live=True)
+    console.print("  ".join(keys), style='cyan')
+    count = 0
+    for u in logs:
+        console.print("  ".join(render_row(u, keys)), style='green', highlight=False, soft_wrap=True)
+        count += 1
+    if count == 0:
+        console.log("[red]No firewall logs located.")
+    else:
+        console.log("[green]{0} unique rows.".format(count))
+
+
+@splunkmetrics.timed('render')
+def summary_log_output(logs):
+    """Builds the rich table for per-flow summaries, one row per distinct flow with how many times it was seen, then
+    prints it nicely in green."""
+    if outputformat != 'table':
+        return plain_output(logs, summarykeys + ['count', 'bytes', 'first_seen', 'last_seen'])
+    if len(logs) != 0:
+        try:
+            table = Table(show_header=True, header_style="cyan", show_lines=True)
+            for key in summarykeys + ['count', 'bytes', 'first_seen', 'last_seen']:
+                table.add_column(key, justify="center")
             for u in logs:
-                table.add_row(u['_time'].split('.')[0], u['host'],
-                u['src_ip'], u['dest_ip'], u['dest_port'], u['application'], u['action'])
+                times = [strftime('%Y-%m-%d %H:%M:%S', localtime(float(u[key]))) if key in u else 'Missing.'
+                         for key in ('first_seen', 'last_seen')]
+                table.add_row(*[u.get(key, 'Missing.') for key in summarykeys + ['count', 'bytes']] + times)
             console.print(table, style='green')
             print("\n")
         except:
@@ -206,20 +473,92 @@ def short_log_output(logs):
         console.log("[red]No firewall logs located.")
 
 
+@splunkmetrics.timed('render')
+def batch_output(indicators, hits):
+    """Builds the rich table of indicators that had hits, most hits first, then prints it nicely in green."""
+    if outputformat != 'table':
+        rows = [dict(hits[x], indicator=x, peers=str(len(hits[x]['peers']))) for x in sorted(hits, key=lambda x: -hits[x]['hits'])]
+        writer = RowWriter(outputformat, ['indicator', 'hits', 'first_seen', 'last_seen', 'peers'])
+        writer.write(rows)
+        writer.close()
+        console.log("[yellow]{0} of {1} indicators had firewall hits.".format(len(hits), len(indicators)))
+        return
+    if len(hits) != 0:
+        try:
+            table = Table(show_header=True, header_style="cyan", show_lines=True)
+            table.add_column("indicator", justify="center")
+            table.add_column("hits", justify="center")
+            table.add_column("first_seen", justify="center")
+            table.add_column("last_seen", justify="center")
+            table.add_column("peers", justify="center")
+            for indicator in sorted(hits, key=lambda x: -hits[x]['hits']):
+                hit = hits[indicator]
+                table.add_row(indicator, str(hit['hits']),
+                strftime('%Y-%m-%d %H:%M:%S', localtime(hit['first_seen'])),
+                strftime('%Y-%m-%d %H:%M:%S', localtime(hit['last_seen'])), str(len(hit['peers'])))
+            console.print(table, style='green')
+            print("\n")
+        except:
+            console.print("[!] Error: ", sys.exc_info(), style='bold red')
+            pass
+    console.log("[yellow]{0} of {1} indicators had firewall hits.".format(len(hits), len(indicators)))
+
+
 def main():
     try:
         args = get_args()
-        global service
-        service = build_service()
-        query, ksearch = build_search_query(args)
+        global service, outputformat
+        outputformat = args.format
+        if outputformat != 'table':
+            take_stdout()
+        if 'metrics' in args:
+            splunkmetrics.enable()
+        with splunkmetrics.phase('login'):
+            service = build_service()
+        if 'no_cache' in args:
+            splunkcache.disable()
+        limit = getattr(args, 'limit', None)
+        slices = getattr(args, 'slices', None)
         try:
-            if 'output' in args:
-                full_log_output(dedupe_firewall_logs(query_fw(query, ksearch)))
+            if 'batch_file' in args:
+                if 'source' in args or 'dest' in args:
+                    console.log("[red]-s/-d are ignored in batch mode, every indicator is matched as either.")
+                splunkscheduler.set_priority('batch')
+                indicators = read_batch_file(args.batch_file)
+                queries, ksearch = build_batch_queries(args, indicators)
+                batch_output(indicators, query_batch(queries, ksearch))
+            elif 'follow' in args:
+                query, ksearch = build_follow_query(args)
+                row_type = FirewallRow if 'output' in args else FirewallShortRow
+                try:
+                    stream_log_output(iter_follow_dedupe(follow_fw(query, ksearch, row_type)), row_type.fields)
+                except KeyboardInterrupt:
+                    console.log("[yellow]Stopped following.")
+            elif 'tstats' in args and 'output' not in args and 'stream' not in args:
+                query, ksearch = build_tstats_query(args)
+                summary_log_output(query_fw(query, ksearch, limit=limit, row_type=None))
+            elif 'summary' in args:
+                if 'output' in args or 'stream' in args:
+                    console.log("[red]-o and --stream are ignored with --summary.")
+                query, ksearch = build_search_query(args)
+                rows = query_fw(query, ksearch, limit=None if slices else limit, slices=slices, row_type=None)
+                summary_log_output(merge_summary_rows(rows, limit) if slices else rows)
             else:
-                short_log_output(dedupe_firewall_logs(query_fw(query, ksearch)))
+                if 'tstats' in args:
+                    console.log("[red]Full rows were asked for, so falling back to a raw event search.")
+                query, ksearch = build_search_query(args)
+                row_type = FirewallRow if 'output' in args else FirewallShortRow
+                if 'stream' in args:
+                    stream_log_output(iter_dedupe_firewall_logs(stream_fw(query, ksearch, limit, slices, row_type)), row_type.fields)
+                elif 'output' in args:
+                    full_log_output(dedupe_firewall_logs(query_fw(query, ksearch, limit=limit, slices=slices, row_type=row_type)))
+                else:
+                    short_log_output(dedupe_firewall_logs(query_fw(query, ksearch, limit=limit, slices=slices, row_type=row_type)))
         except:
             console.print("[!] Error: ", sys.exc_info(), style='bold red')
         console.log("[yellow][!] Done.")
+        if 'metrics' in args:
+            splunkmetrics.write(args.metrics)
         exit()
     except KeyboardInterrupt:
         console.log("[red]\n[!!!] Ctrl + C Detected!")
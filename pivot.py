@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# 10/18/26 GitStoph
+# Splunk script to pivot from one indicator across DHCP, logon and firewall logs in one run.
+##################################################
+import sys
+import os
+from dotenv import load_dotenv
+import argparse
+import re
+from rich.console import Console
+from rich.table import Table
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+"""
+This script was intended to be run from the bin, so it needs to add the /opt/splunkscripts directory to path
+to access all the libraries it needs, as well as the .env configuration file. Set SPLUNKSCRIPTS_HOME to use a
+different directory. Please note this is an example, and not necessarily how secure credentials should be handled.
+Triage of one indicator used to mean running searchdhcp.py, then u2m.py, then checkfw.py by hand with whatever the
+last one turned up. This does the same lookups with the same functions, over one login, and starts each search as
+soon as what it needs is known: an IP goes to the DHCP and firewall searches at once, a username to the logon
+search, the hosts that turns up to the DHCP searches, and the IPs those turn up to the firewall search. Going the
+other way, a host found in DHCP goes to the logon search by host, which turns up who used it. Searches that
+don't depend on each other run side by side, so the whole pivot takes about as long as its slowest chain.
+"""
+console = Console()
+os.chdir(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'))
+current_dir = os.getcwd()
+sys.path.append(current_dir)
+fpath = os.getcwd()
+load_dotenv(os.path.join(fpath, '.env'))
+import splunkcache
+import splunkmetrics
+from splunkquery import is_ipaddress, is_cidr, mac_digits
+import checkfw
+import searchdhcp
+import u2m
+pivotjobs = int(os.getenv('SPLUNK_PIVOT_JOBS', '6'))
+kinds = ['ip', 'mac', 'host', 'user']
+# Which searches take each kind of value, and which family each search belongs to. A value never goes back to the
+# family of search that found it, since the DHCP searches would only find the same leases again.
+searches = {'windhcp': {'family': 'dhcp', 'takes': ['ip', 'mac', 'host']},
+            'padhcp': {'family': 'dhcp', 'takes': ['ip', 'mac', 'host']},
+            'logons': {'family': 'logons', 'takes': ['user']},
+            'hostlogons': {'family': 'logons', 'takes': ['host']},
+            'firewall': {'family': 'firewall', 'takes': ['ip']}}
+pa_lease = re.compile(r'ip (\S+) --> mac (\S+) - hostname (\S+)')
+
+def get_args():
+    parser = argparse.ArgumentParser(
+        description='Pivots from an IP, MAC, hostname or username through the DHCP, Windows logon and firewall logs, running each search as soon as its input is known.')
+    parser.add_argument('-s', '--search',required=True,type=str,action='store', help='The indicator to start from.')
+    parser.add_argument('-k', '--kind',required=False,type=str,default='auto',choices=['auto'] + kinds, help="What the indicator is. 'auto' picks IPs, CIDRs and MACs out, and treats anything else as both a hostname and a username.")
+    parser.add_argument('-d', '--depth',required=False,type=int,default=2,action='store', help='How many hops to follow from the indicator. 2 gets from a username to its hosts, their IPs and their firewall logs, or from an IP to its host and the users who logged on to it.')
+    parser.add_argument('-m', '--max-pivots',required=False,type=int,default=5,action='store', help='Most values each search gets run for, most recent first. Keeps a busy user from fanning out into hundreds of searches.')
+    parser.add_argument('-l', '--limit',required=False,type=int,default=100,action='store', help='Most rows each search returns.')
+    parser.add_argument('-t', '--time',required=False,type=str,default='24h',choices=checkfw.timeoptions, help="How far back the firewall searches look. The DHCP and logon searches always cover 72h.")
+    parser.add_argument('--no-cache',required=False,action='store_true', help='Skip the local result cache and run fresh searches.')
+    parser.add_argument('--no-index',required=False,action='store_true', help='Ignore the local DHCP index and user to host map and search splunk for the whole window.')
+    parser.add_argument('--metrics',required=False,type=str,default=None,nargs='?',const='-', help='Time each phase of the run and print the timings and job stats as JSON to stderr, or append them to the given file.')
+    args = parser.parse_args()
+    return args
+
+
+def seeds(indicator, kind):
+    """The (kind, value) pairs to start from."""
+    if kind != 'auto':
+        return [(kind, indicator)]
+    if is_ipaddress(indicator) or is_cidr(indicator):
+        return [('ip', indicator)]
+    if mac_digits(indicator):
+        return [('mac', indicator)]
+    return [('host', indicator), ('user', indicator)]
+
+
+def search_windhcp(value, args):
+    return searchdhcp.dedupe_windhcp_logs(searchdhcp.query_windhcp(value, args.limit))
+
+
+def search_padhcp(value, args):
+    return searchdhcp.dedupe_padhcp_logs(searchdhcp.query_padhcp(value, args.limit))
+
+
+def search_logons(value, args):
+    return u2m.dedupe_win_logs(u2m.lookup_win_users([value], args.limit))
+
+
+def search_hostlogons(value, args):
+    return u2m.dedupe_win_logs(u2m.lookup_win_users([value], args.limit, field='host'))
+
+
+def search_firewall(value, args):
+    """Counts the flows from the IP, one row per flow, like checkfw.py -s <ip> --summary."""
+    query, kwargsearch = checkfw.build_search_query(Namespace(source=value, time=args.time, summary=None, limit=args.limit))
+    return checkfw.query_fw(query, kwargsearch, row_type=None)
+
+
+def found_windhcp(logs):
+    """The IPs, MACs and hosts in Windows DHCP rows, newest first. Hosts are cut to their short name, which is what
+    the other searches know them by."""
+    for u in logs:
+        if u.get('dest_ip'):
+            yield 'ip', u['dest_ip']
+        if u.get('mac'):
+            yield 'mac', u['mac']
+        if u.get('dest'):
+            yield 'host', u['dest'].split('.')[0]
+
+
+def found_padhcp(logs):
+    for u in logs:
+        lease = pa_lease.search(u.get('description', ''))
+        if lease:
+            yield 'ip', lease.group(1)
+            yield 'mac', lease.group(2)
+            yield 'host', lease.group(3).split('.')[0]
+
+
+def found_logons(logs):
+    for u in logs:
+        if u.get('host'):
+            yield 'host', u['host']
+
+
+def found_hostlogons(logs):
+    for u in logs:
+        if u.get('user'):
+            yield 'user', u['user']
+
+
+def found_firewall(logs):
+    return iter(())
+
+
+runners = {'windhcp': (search_windhcp, found_windhcp, searchdhcp.pretty_windows_output),
+           'padhcp': (search_padhcp, found_padhcp, searchdhcp.pretty_pa_output),
+           'logons': (search_logons, found_logons, u2m.pretty_windows_output),
+           'hostlogons': (search_hostlogons, found_hostlogons, u2m.pretty_windows_output),
+           'firewall': (search_firewall, found_firewall, checkfw.summary_log_output)}
+
+
+def entity_key(kind, value):
+    """What makes two values the same, so a MAC written two ways is only followed once."""
+    if kind == 'mac':
+        return kind, mac_digits(value) or value.lower()
+    return kind, value.lower()
+
+
+def run_pivot(args):
+    """Runs the pivot and prints each search's table as it finishes. Returns what was found, as a dict of
+    (kind, value) to where it came from and how many hops away it was."""
+    found = {}
+    started = set()
+    runs = dict((name, 0) for name in searches)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=pivotjobs) as pool:
+
+        def discover(kind, value, source, hop):
+            key = entity_key(kind, value)
+            if key in found:
+                return
+            found[key] = {'kind': kind, 'value': value, 'source': source, 'hop': hop}
+            if hop > args.depth:
+                return
+            family = searches[source.split()[0]]['family'] if source != 'indicator' else None
+            for name, search in searches.items():
+                if kind not in search['takes'] or search['family'] == family or (name, key) in started:
+                    continue
+                if runs[name] >= args.max_pivots:
+                    console.log("[yellow]Skipping {0} for {1}, it already ran for {2} values. Raise -m to follow more.".format(name, value, args.max_pivots))
+                    continue
+                started.add((name, key))
+                runs[name] += 1
+                console.log("[green]Starting {0} for {1} {2}..".format(name, kind, value))
+                pending[pool.submit(runners[name][0], value, args)] = (name, value, hop)
+
+        for kind, value in seeds(args.search, args.kind):
+            discover(kind, value, 'indicator', 0)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, value, hop = pending.pop(future)
+                _, found_in, output = runners[name]
+                try:
+                    logs = future.result()
+                except:
+                    console.print("[!] Error in {0} for {1}: ".format(name, value), sys.exc_info(), style='bold red')
+                    continue
+                console.log("[cyan]{0} for {1}:".format(name, value))
+                output(logs)
+                for kind, newvalue in found_in(logs):
+                    discover(kind, newvalue, "{0} {1}".format(name, value), hop + 1)
+    return found
+
+
+def pivot_output(found):
+    """Prints every value the pivot turned up and where it came from, in the order they were found."""
+    table = Table(show_header=True, header_style="cyan", show_lines=True)
+    table.add_column("Kind", justify="center")
+    table.add_column("Value", justify="center")
+    table.add_column("Found by", justify="center")
+    table.add_column("Hops", justify="center")
+    for entry in found.values():
+        table.add_row(entry['kind'], entry['value'], entry['source'], str(entry['hop']))
+    console.print(table, style='green')
+    print("\n")
+
+
+def main():
+    try:
+        args = get_args()
+        if args.metrics:
+            splunkmetrics.enable()
+        with splunkmetrics.phase('login'):
+            service = checkfw.build_service()
+        checkfw.service = searchdhcp.service = u2m.service = service
+        if args.no_cache:
+            splunkcache.disable()
+        if args.no_index:
+            searchdhcp.useindex = u2m.useindex = False
+        try:
+            pivot_output(run_pivot(args))
+        except:
+            console.print("[!] Error: ", sys.exc_info(), style='bold red')
+        console.log("[yellow][!] Done.")
+        if args.metrics:
+            splunkmetrics.write(args.metrics)
+        exit()
+    except KeyboardInterrupt:
+        console.log("[red]\n[!!!] Ctrl + C Detected!")
+        console.log("[red][XXX] Exiting script now..")
+        exit()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        console.log("[red]\n[!!!] Ctrl + C Detected!")
+        console.log("[red][XXX] Exiting script now..")
+        exit()
@@ -4,55 +4,66 @@
 ##################################################
 import sys
 import os
-from time import sleep
-import splunklib.results as results
-import splunklib.client as client
 from dotenv import load_dotenv
 import getpass
 import argparse
 import re
 from rich.console import Console
 from rich.table import Table
-import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 """
 This script was intended to be run from the bin, so it needs to add the /opt/splunkscripts directory to path
-to access all the libraries it needs, as well as the .env configuration file. Please note this is an example,
-and not necessarily how secure credentials should be handled.
+to access all the libraries it needs, as well as the .env configuration file. Set SPLUNKSCRIPTS_HOME to use a
+different directory. Please note this is an example, and not necessarily how secure credentials should be handled.
 """
 
 console = Console()
-os.chdir('/opt/splunkscripts')
+os.chdir(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'))
 current_dir = os.getcwd()
 sys.path.append(current_dir)
 fpath = os.getcwd()
 load_dotenv(os.path.join(fpath, '.env'))
+from splunkjobs import run_search, run_sliced_search, stream_search, spl_head
+import splunkcache
+import splunkdaemon
+import splunkmetrics
+import splunkscheduler
+from splunkdedupe import dedupe, spl_dedup
+from splunkoutput import FORMATS, RowWriter
+import splunkindex
+from splunkquery import is_ipaddress, is_cidr, mac_digits, term, ip_filter, text_filter
+windhcpkeys = ['date', 'time', 'description', 'dest', 'dest_ip', 'mac', 'signature', 'host']
+padhcpkeys = ['generated_time', 'dvc_name', 'description']
+dhcpkeys = ['source', 'date', 'time', 'generated_time', 'host', 'dvc_name', 'description', 'dest', 'dest_ip', 'mac', 'signature']
+writer = None
+useindex = True
 
 def get_args():
     parser = argparse.ArgumentParser(
         description='Splunk DHCP search tool.')
-    parser.add_argument('-s', '--search',required=False,type=str,default='None',action='store', help='String to search?')
+    parser.add_argument('-s', '--search',required=False,type=str,default='None',action='store', help='String to search? An IP, a CIDR like 10.1.0.0/16, a MAC in any format, or the start of a hostname.')
+    parser.add_argument('-l', '--lines',required=False,type=int,default=None,action='store', help='How many lines of output should we print? Each search stops early once it has this many.')
+    parser.add_argument('--no-cache',required=False,action='store_true', help='Skip the local result cache and run a fresh search.')
+    parser.add_argument('--no-index',required=False,action='store_true', help='Ignore the local DHCP index and search splunk for the whole window.')
+    parser.add_argument('--sync',required=False,action='store_true', help='Pull the DHCP events since the last sync into the local index, then exit. Run it from cron.')
+    parser.add_argument('-f', '--format',required=False,type=str,default='table',choices=FORMATS, help="'table' draws the usual tables. 'csv', 'tsv' and 'jsonl' write plain rows to stdout instead, with a source column saying which search each row came from.")
+    parser.add_argument('--metrics',required=False,type=str,default=None,nargs='?',const='-', help='Time each phase of the run and print the timings and job stats as JSON to stderr, or append them to the given file.')
+    parser.add_argument('--slices',required=False,type=int,default=None,action='store', help='Split the 72h window into this many time slices and search them in parallel.')
     args = parser.parse_args()
     return args
 
 
 def build_service():
-    """Builds the service object using the client function after grabbing the necessary fields from a .env file."""
-    service = client.connect(host=os.getenv('SPLUNK_HOST'),
-                            port=os.getenv('SPLUNK_PORT'),
-                            scheme=os.getenv('SPLUNK_SCHEME'),
-                            username=os.getenv('SPLUNK_USER'),
-                            password=os.getenv('SPLUNK_PASS'))
-    return service
-
-
-def is_ipaddress(query):
-    """Checks to see if the query is an IP. Returns true/false accordingly."""
-    try:
-        socket.inet_aton(query)
-        return True
-    except socket.error:
-        return False
+    """Builds the service object after grabbing the necessary fields from a .env file. The session key is reused between
+    runs and every REST call shares a pool of keep-alive connections, see splunksession.py.
+    If splunkdaemon.py is running, the searches are handed to it instead, and splunklib never gets imported here."""
+    service = splunkdaemon.connect()
+    if service is not None:
+        return service
+    import splunksession
+    return splunksession.build_service()
 
 
 def format_mac_windhcp(mac: str) -> str:
@@ -67,48 +78,34 @@ def format_mac_windhcp(mac: str) -> str:
         pass
 
 
-def query_windhcp(query):
+def query_windhcp(query, limit=None, slices=None):
     """Uses the format_mac_windhcp to create a potential MAC to search which gets plugged into the searchquery_normal format line. The rest of the line is formatted with the original
     query string in case it wasn't a MAC address originally passed. kwargs are added to do a normal search over the last 72hours. Stats are printed out to the console.log to let the
     user know the status of their search. Logs are then extracted from the job and returned."""
     console.log("[green] Searching Windows DHCP logs..")
-    if is_ipaddress(query) == True:
-        mac = query
+    terms = None
+    if is_ipaddress(query) or is_cidr(query):
+        base, post = ip_filter('dest_ip', query)
+        if is_ipaddress(query):
+            terms = [(['dest_ip'], query, True)]
+    elif mac_digits(query):
+        mac = format_mac_windhcp(query)
+        base, post = "{0} mac={1} ".format(term(mac), mac), ""
+        terms = [(['mac'], mac, True)]
     else:
         mac = format_mac_windhcp(query)
-    searchquery_normal = 'search index=ops_app_dhcp signature!="DNS*" (description=*{0}* OR dest=*{0}* OR dest_ip=*{0}* OR mac=*{1}* )| table date time description dest dest_ip mac signature host'.format(query, mac)
+        base, post = text_filter(['description', 'dest', 'dest_ip', 'mac'], query, mac)
+        terms = [(['description', 'dest', 'dest_ip'], query), (['mac'], mac)]
+    searchquery_normal = 'search index=ops_app_dhcp signature!="DNS*" {0}{1}{2}| table date time description dest dest_ip mac signature host {3}'.format(base, post, spl_dedup(['mac'], keepempty=False), spl_head(limit))
     kwargs_normalsearch = {'exec_mode': 'normal', 'earliest_time': '-72h', 'latest_time': 'now'}
-    job = service.jobs.create(searchquery_normal, **kwargs_normalsearch)
-    # A normal search returns the job's SID right away, so we need to poll for completion
-    while True:
-        while not job.is_ready():
-            pass
-        stats = {"isDone": job["isDone"],
-                 "doneProgress": float(job["doneProgress"])*100,
-                  "scanCount": int(job["scanCount"]),
-                  "eventCount": int(job["eventCount"]),
-                  "resultCount": int(job["resultCount"])}
-        console.log(f"[purple]{stats['doneProgress']}%   [blue]{stats['scanCount']} scanned   [yellow]{stats['eventCount']} matched   [green]{stats['resultCount']} results")
-        if stats["isDone"] == "1":
-            console.log("[blue]\n[!] Done!\n")
-            break
-        sleep(1)
-    logs = [x for x in results.ResultsReader(job.results())]
-    job.cancel()
-    return logs
+    return indexed_search('windhcp', windhcpkeys, terms, searchquery_normal, kwargs_normalsearch, 'Windows', limit, slices,
+                          dedupe_windhcp_logs)
 
 
+@splunkmetrics.timed('dedupe')
 def dedupe_windhcp_logs(logs):
-    """Dedupe by MAC address. """
-    macs = set()
-    nodupes = []
-    for x in logs:
-        if 'mac' in x.keys():
-            y = tuple(sorted(x.items()))[5]
-            if y not in macs:
-                macs.add(y)
-                nodupes.append(x)
-    return nodupes
+    """Dedupe by MAC address. Logs without a MAC are dropped. """
+    return dedupe(logs, ['mac'], require=True)
 
 
 def format_mac_padhcp(macaddress: str) -> str:
@@ -126,51 +123,77 @@ def format_mac_padhcp(macaddress: str) -> str:
         pass
 
 
-def query_padhcp(query):
+def query_padhcp(query, limit=None, slices=None):
     """Uses the format_mac_windhcp to create a potential MAC to search which gets plugged into the searchquery_normal format line. The rest of the line is formatted with the original
     query string in case it wasn't a MAC address originally passed. kwargs are added to do a normal search over the last 72hours. Stats are printed out to the console.log to let the
     user know the status of their search. Logs are then extracted from the job and returned."""
     console.log("[green] Searching PA DHCP logs..")
-    if is_ipaddress(query) == True:
-        mac = query
+    terms = None
+    if is_ipaddress(query) or is_cidr(query):
+        base, post = ip_filter('lease_ip', query, rex='| rex field=description "ip (?<lease_ip>\\d+\\.\\d+\\.\\d+\\.\\d+)" ')
+        if is_ipaddress(query):
+            terms = [(['description'], query, True)]
+    elif mac_digits(query):
+        mac = format_mac_padhcp(query)
+        base, post = "{0} ".format(term(mac)), ""
+        terms = [(['description'], mac, True)]
     else:
         mac = format_mac_padhcp(query)
-    searchquery_normal = 'search index=sec_net_firewall sourcetype="pan:system" log_subtype=dhcp (description=*{0}* OR description=*{1}*)| table generated_time dvc_name description'.format(query, mac)
+        base, post = text_filter(['description'], query, mac)
+        terms = [(['description'], query), (['description'], mac)]
+    searchquery_normal = 'search index=sec_net_firewall sourcetype="pan:system" log_subtype=dhcp {0}{1}{2}| table generated_time dvc_name description {3}'.format(base, post, spl_dedup(['description']), spl_head(limit))
     kwargs_normalsearch = {'exec_mode': 'normal', 'earliest_time': '-72h', 'latest_time': 'now'}
-    job = service.jobs.create(searchquery_normal, **kwargs_normalsearch)
-    # A normal search returns the job's SID right away, so we need to poll for completion
-    while True:
-        while not job.is_ready():
-            pass
-        stats = {"isDone": job["isDone"],
-                 "doneProgress": float(job["doneProgress"])*100,
-                  "scanCount": int(job["scanCount"]),
-                  "eventCount": int(job["eventCount"]),
-                  "resultCount": int(job["resultCount"])}
-        console.log(f"[purple]{stats['doneProgress']}%   [blue]{stats['scanCount']} scanned   [yellow]{stats['eventCount']} matched   [green]{stats['resultCount']} results")
-        if stats["isDone"] == "1":
-            console.log("[blue]\n[!] Done!\n")
-            break
-        sleep(1)
-    logs = [x for x in results.ResultsReader(job.results())]
-    job.cancel()
-    return logs
+    return indexed_search('padhcp', padhcpkeys, terms, searchquery_normal, kwargs_normalsearch, 'PA', limit, slices,
+                          dedupe_padhcp_logs)
+
 
+def indexed_search(name, keys, terms, searchquery, kwargsearch, label, limit=None, slices=None, dedupe_logs=None):
+    """Answers a lookup from the local index up to its last sync, and only asks splunk about the events since then.
+    The splunk rows come first, so the result is still newest first. The index keeps every event, not just one per
+    MAC or description like the splunk searches, so the two are run through dedupe_logs before the limit is applied. Without a usable index, with --no-index, or
+    without terms, like for a CIDR the index can't match, the whole window is searched in splunk like before. IPs and
+    whole MACs are passed as whole word terms, so the index matches them exactly like their TERM() does in splunk."""
+    synced = splunkindex.checkpoint(name) if useindex and terms else None
+    local = splunkindex.search(name, keys, terms) if synced is not None else None
+    if local is None:
+        return run_sliced_search(service, searchquery, kwargsearch, slices, label=label, limit=limit)
+    console.log("[green]{0} {1} DHCP events from the local index, searching splunk since its last sync {2:.0f}s ago..".format(
+        len(local), label, time.time() - synced))
+    newer = run_search(service, searchquery, dict(kwargsearch, earliest_time=str(int(synced))), label=label, limit=limit)
+    logs = newer + local
+    if dedupe_logs is not None:
+        logs = dedupe_logs(logs)
+    return logs[:limit] if limit else logs
 
+
+def sync_index():
+    """Pulls every Windows and PA DHCP event since the last sync off the export endpoint into the local index. The
+    first sync pulls the whole horizon."""
+    syncs = [('windhcp', windhcpkeys, ['description', 'dest', 'dest_ip', 'mac'],
+              'search index=ops_app_dhcp signature!="DNS*" | eval epoch=_time | table epoch {0}'.format(" ".join(windhcpkeys))),
+             ('padhcp', padhcpkeys, ['description'],
+              'search index=sec_net_firewall sourcetype="pan:system" log_subtype=dhcp | eval epoch=_time | table epoch {0}'.format(" ".join(padhcpkeys)))]
+    for name, keys, searchable, query in syncs:
+        started = time.time()
+        kwargs_export = {'earliest_time': str(splunkindex.sync_start(name)), 'latest_time': 'now'}
+        console.log("[yellow]Syncing {0} from {1}..".format(name, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(kwargs_export['earliest_time'])))))
+        rows = stream_search(service, query, kwargs_export, fields=['epoch'] + keys)
+        added = splunkindex.sync(name, keys, searchable, rows, started)
+        if added is not None:
+            console.log("[green]{0} new {1} events indexed in {2:.1f}s.".format(added, name, time.time() - started))
+
+
+@splunkmetrics.timed('dedupe')
 def dedupe_padhcp_logs(logs):
     """Dedupe by description field. """
-    macs = set()
-    nodupes = []
-    for x in logs:
-        y = tuple(sorted(x.items()))[0]
-        if y not in macs:
-            macs.add(y)
-            nodupes.append(x)
-    return nodupes
+    return dedupe(logs, ['description'])
 
 
+@splunkmetrics.timed('render')
 def pretty_windows_output(logs):
     """Builds the rich table, adds the columns, adds the rows, then prints it nicely in green. This is for Windows DHCP logs."""
+    if writer is not None:
+        return writer.write(logs, source='windows')
     if len(logs) != 0:
         try:
             table = Table(show_header=True, header_style="cyan", show_lines=True)
@@ -194,8 +217,11 @@ def pretty_windows_output(logs):
         console.log("[red]No Windows DHCP logs located.")
 
 
+@splunkmetrics.timed('render')
 def pretty_pa_output(logs):
     """Builds the rich table, adds the columns, adds the rows, then prints it nicely in green. This is for PaloAlto DHCP logs."""
+    if writer is not None:
+        return writer.write(logs, source='pa')
     if len(logs) != 0:
         try:
             table = Table(show_header=True, header_style="cyan", show_lines=True)
@@ -216,17 +242,38 @@ def pretty_pa_output(logs):
 def main():
     try:
         args = get_args()
-        global service
-        service = build_service()
-        try:
-            pretty_windows_output(dedupe_windhcp_logs(query_windhcp(args.search)))
-        except:
-            console.log("[red] No windows DHCP logs were found.")
-        try:
-            pretty_pa_output(dedupe_padhcp_logs(query_padhcp(args.search)))
-        except:
-            console.log("[red] No PA DHCP logs were found.")
+        global service, writer, useindex
+        if args.format != 'table':
+            writer = RowWriter(args.format, dhcpkeys)
+        if args.metrics:
+            splunkmetrics.enable()
+        with splunkmetrics.phase('login'):
+            service = build_service()
+        if args.no_cache:
+            splunkcache.disable()
+        if args.no_index:
+            useindex = False
+        if args.sync:
+            splunkscheduler.set_priority('batch')
+            sync_index()
+            console.log("[yellow][!] Done.")
+            exit()
+        # Both searches are dispatched up front and polled side by side. Whichever finishes first gets printed first.
+        searches = {'windows': (query_windhcp, dedupe_windhcp_logs, pretty_windows_output, "[red] No windows DHCP logs were found."),
+                    'pa': (query_padhcp, dedupe_padhcp_logs, pretty_pa_output, "[red] No PA DHCP logs were found.")}
+        with ThreadPoolExecutor(max_workers=len(searches)) as pool:
+            futures = {pool.submit(query, args.search, args.lines, args.slices): name for name, (query, _, _, _) in searches.items()}
+            for future in as_completed(futures):
+                _, dedupe_logs, output, missing = searches[futures[future]]
+                try:
+                    output(dedupe_logs(future.result()))
+                except:
+                    console.log(missing)
+        if writer is not None:
+            writer.close()
         console.log("[yellow][!] Done.")
+        if args.metrics:
+            splunkmetrics.write(args.metrics)
         exit()
     except KeyboardInterrupt:
         console.log("[red]\n[!!!] Ctrl + C Detected!")
@@ -0,0 +1,140 @@
+# 10/18/26 GitStoph
+# On-disk result cache for the splunk scripts.
+##################################################
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+from rich.console import Console
+
+"""
+During an incident everybody runs the same handful of lookups over and over, and every one of them used to launch a
+fresh search job. This keeps finished result sets in a small SQLite file. The key is the whitespace-normalized SPL
+plus the time window and the splunk user, host and port it ran against, with relative windows like -4h snapped to a CACHE_SNAP second bucket so that reruns a couple of
+minutes apart land on the same entry. Entries older than CACHE_TTL are ignored, and once the file holds more than
+CACHE_MAX_BYTES of results the least recently used entries are evicted. Any SQLite trouble just means no caching.
+Every analyst on the box shares the file, so it's created writable by everyone, the same way splunkscheduler sets up
+SCHED_DIR. SQLite creates its journal next to the file with the file's mode, so a directory this makes is made 1777
+too. If someone else created the file without that, reads still work, they just don't bump the entry's LRU time.
+"""
+
+console = Console()
+CACHE_PATH = os.getenv('SPLUNK_CACHE_PATH', os.path.join(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'), 'results_cache.sqlite'))
+CACHE_TTL = float(os.getenv('SPLUNK_CACHE_TTL', '300'))
+CACHE_SNAP = int(os.getenv('SPLUNK_CACHE_SNAP', '300'))
+CACHE_MAX_BYTES = int(os.getenv('SPLUNK_CACHE_MAX_MB', '256')) * 1024 * 1024
+enabled = True
+
+
+def disable():
+    """Turns the cache off for the rest of the run. The scripts call this for --no-cache."""
+    global enabled
+    enabled = False
+
+
+def prepare():
+    """Creates the cache directory and file writable by everyone if they aren't there yet. Like SCHED_DIR, the mode
+    is set explicitly since the umask gets in the way, and a file someone else owns is left as they set it."""
+    directory = os.path.dirname(os.path.abspath(CACHE_PATH))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+        if os.stat(directory).st_uid == os.getuid():
+            os.chmod(directory, 0o1777)
+    try:
+        fd = os.open(CACHE_PATH, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+        os.fchmod(fd, 0o666)
+        os.close(fd)
+    except FileExistsError:
+        info = os.stat(CACHE_PATH)
+        if info.st_uid == os.getuid() and info.st_mode & 0o666 != 0o666:
+            os.chmod(CACHE_PATH, 0o666)
+
+
+def connect():
+    prepare()
+    db = sqlite3.connect(CACHE_PATH, timeout=10)
+    db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, query TEXT, created REAL, accessed REAL, '
+               'size INTEGER, rows BLOB)')
+    db.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+    return db
+
+
+def normalize_query(query):
+    """Collapses runs of whitespace so cosmetic differences in the SPL don't miss the cache."""
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+def snap_window(kwargsearch, now=None):
+    """Turns the search's time window into something stable enough to key on. Relative times like -4h or now are
+    pinned to the current CACHE_SNAP bucket, absolute times are kept as they are."""
+    now = time.time() if now is None else now
+    bucket = int(now // CACHE_SNAP) * CACHE_SNAP
+    window = []
+    for name in ('earliest_time', 'latest_time'):
+        value = str(kwargsearch.get(name, ''))
+        if value == 'now' or value.startswith('-') or value.startswith('+'):
+            value = '{0}@{1}'.format(value, bucket)
+        window.append(value)
+    return window
+
+
+def cache_key(query, kwargsearch, fields=None, now=None, limit=None):
+    """Hashes the normalized query, the snapped window, the projected fields, the row limit and the splunk user, host
+    and port into the cache key. Two users see different indexes, and two hosts are different data altogether."""
+    extra = dict((k, v) for k, v in kwargsearch.items() if k not in ('earliest_time', 'latest_time', 'exec_mode'))
+    server = [os.getenv('SPLUNK_USER'), os.getenv('SPLUNK_HOST'), os.getenv('SPLUNK_PORT')]
+    blob = json.dumps([normalize_query(query), snap_window(kwargsearch, now), sorted(extra.items()), fields, limit, server])
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    """Returns the cached rows for key, or None if there's nothing fresh enough."""
+    if not enabled:
+        return None
+    try:
+        db = connect()
+        try:
+            row = db.execute('SELECT created, rows FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None or time.time() - row[0] > CACHE_TTL:
+                return None
+            try:
+                with db:
+                    db.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+            except sqlite3.OperationalError:
+                pass
+            console.log("[green]Using cached results from {0:.0f}s ago. Pass --no-cache to run a fresh search.".format(time.time() - row[0]))
+            return json.loads(zlib.decompress(row[1]).decode('utf-8'))
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError, ValueError, zlib.error) as error:
+        console.log("[red]Result cache unavailable: {0}".format(error))
+        return None
+
+
+def put(key, query, rows):
+    """Stores rows under key, then evicts least recently used entries until the cache fits in CACHE_MAX_BYTES. Rows
+    that aren't dicts (splunkrows records) are stored as their as_dict()."""
+    if not enabled:
+        return
+    blob = zlib.compress(json.dumps(rows, default=lambda row: row.as_dict()).encode('utf-8'))
+    now = time.time()
+    try:
+        db = connect()
+        try:
+            with db:
+                db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                           (key, normalize_query(query), now, now, len(blob), blob))
+                db.execute('DELETE FROM results WHERE created < ?', (now - CACHE_TTL,))
+                total = db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+                for old_key, size in db.execute('SELECT key, size FROM results ORDER BY accessed').fetchall():
+                    if total <= CACHE_MAX_BYTES:
+                        break
+                    db.execute('DELETE FROM results WHERE key = ?', (old_key,))
+                    total -= size
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as error:
+        console.log("[red]Result cache unavailable: {0}".format(error))
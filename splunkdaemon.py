@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# 10/18/26 GitStoph
+# Resident splunk daemon, so the search scripts can skip their cold start.
+##################################################
+import sys
+import os
+import json
+import socket
+import socketserver
+import threading
+from dotenv import load_dotenv
+from rich.console import Console
+import splunkjobs
+import splunkscheduler
+
+"""
+Every run of checkfw.py, searchdhcp.py or u2m.py imports splunklib and requests, reads the .env file and opens a
+session before it can dispatch anything. Run this once (under tmux, nohup or a systemd user unit) and it keeps a warm,
+logged in service around. When its socket exists, the scripts hand their searches to it instead of connecting
+themselves, and never import splunklib at all.
+The protocol is one JSON request per connection, {"op": "search" | "stream" | "ping", "args": {...}}, where args are
+the keyword arguments of splunkjobs.run_search or stream_search. The reply is one JSON object per line: {"row": {...}}
+for each result, then {"done": true}, or {"error": "..."} if the search failed. The client's search slot priority
+goes along in args, so batch runs still leave a slot free when they go through the daemon. If the client hangs up
+before its search is done, like on Ctrl + C, the job is cancelled on splunk instead of running to the end for nobody.
+The socket is only accessible to the user who started the daemon, since it searches with their credentials.
+"""
+
+console = Console()
+SOCKET_PATH = os.path.expanduser(os.getenv('SPLUNK_DAEMON_SOCKET', '~/.splunkscripts.sock'))
+
+
+class DaemonError(Exception):
+    """Raised on the client side when the daemon reports that a search failed."""
+
+
+class DaemonClient(object):
+    """Stands in for the splunklib service in the scripts. splunkjobs.run_search and stream_search see is_daemon and
+    forward their arguments here instead of talking to splunk directly."""
+    is_daemon = True
+
+    def __init__(self, path=SOCKET_PATH):
+        self.path = path
+
+    def request(self, op, **args):
+        """Sends one request and yields each reply line as it arrives."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            sock.sendall(json.dumps({'op': op, 'args': args}).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as replies:
+                for line in replies:
+                    reply = json.loads(line)
+                    if 'error' in reply:
+                        raise DaemonError(reply['error'])
+                    if reply.get('done'):
+                        return
+                    yield reply
+            raise DaemonError("The splunk daemon hung up before the search finished.")
+        finally:
+            sock.close()
+
+    def ping(self):
+        return list(self.request('ping')) == []
+
+    def run_search(self, **args):
+        console.log("[yellow]Search handed to the splunk daemon, waiting on results..")
+        return [reply['row'] for reply in self.request('search', **args)]
+
+    def stream_search(self, **args):
+        for reply in self.request('stream', **args):
+            yield reply['row']
+
+
+def connect(path=SOCKET_PATH):
+    """Returns a DaemonClient if a daemon is answering on the socket, otherwise None."""
+    if not os.path.exists(path):
+        return None
+    client = DaemonClient(path)
+    try:
+        client.ping()
+        return client
+    except (OSError, ValueError, DaemonError):
+        return None
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    wbufsize = 64 * 1024
+
+    def reply(self, message, flush=False):
+        self.wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+        if flush:
+            self.wfile.flush()
+
+    def watch(self, owner):
+        """Waits for the client to hang up. It doesn't send anything after its request, so recv only returns once the
+        connection is closed, by the client or by handle() when it's done, and then anything owner still has running
+        on splunk is cancelled."""
+        try:
+            self.connection.recv(1)
+        except OSError:
+            pass
+        splunkscheduler.cancel_owned(owner)
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            op, args = request.get('op'), request.get('args', {})
+            threading.Thread(target=self.watch, args=(threading.current_thread(),), daemon=True).start()
+            if op == 'search':
+                for row in splunkjobs.run_search(self.server.service, **args):
+                    self.reply({'row': row})
+            elif op == 'stream':
+                for row in splunkjobs.stream_search(self.server.service, **args):
+                    self.reply({'row': row}, flush=True)
+            elif op != 'ping':
+                raise ValueError("Unknown op {0}.".format(op))
+            self.reply({'done': True}, flush=True)
+        except (BrokenPipeError, ConnectionResetError, splunkscheduler.SearchCancelled):
+            pass
+        except Exception as error:
+            console.print("[!] Error: ", sys.exc_info(), style='bold red')
+            try:
+                self.reply({'error': "{0}: {1}".format(type(error).__name__, error)}, flush=True)
+            except OSError:
+                pass
+        finally:
+            try:
+                self.connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=SOCKET_PATH):
+    """Logs in, then answers requests on the socket until Ctrl + C."""
+    import splunksession
+    if connect(path) is not None:
+        console.log("[red]A splunk daemon is already answering on {0}.".format(path))
+        return
+    if os.path.exists(path):
+        os.unlink(path)
+    service = splunksession.build_service()
+    old_umask = os.umask(0o177)
+    try:
+        server = DaemonServer(path, DaemonHandler)
+    finally:
+        os.umask(old_umask)
+    server.service = service
+    console.log("[green]Splunk daemon listening on {0}.".format(path))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    os.chdir(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'))
+    sys.path.append(os.getcwd())
+    load_dotenv(os.path.join(os.getcwd(), '.env'))
+    try:
+        serve(os.path.expanduser(os.getenv('SPLUNK_DAEMON_SOCKET', SOCKET_PATH)))
+    except KeyboardInterrupt:
+        console.log("[red]\n[!!!] Ctrl + C Detected!")
+        console.log("[red][XXX] Exiting daemon now..")
+        exit()
@@ -0,0 +1,60 @@
+# 10/18/26 GitStoph
+# Field-keyed dedupe shared by the splunk scripts.
+##################################################
+import hashlib
+from collections import OrderedDict
+
+"""
+The scripts used to dedupe by sorting every row's items and concatenating whatever sat at a few fixed positions,
+which is slow, and quietly keys on the wrong fields as soon as one field is missing from a row. Dedupe here is keyed
+on field names instead. spl_dedup pushes the same dedupe into the search so most duplicates never leave the search
+head, and iter_dedupe is the client side pass that cleans up whatever is left. It only remembers an 8 byte digest
+per key, and with max_keys set it forgets the least recently seen keys so memory stays flat on endless streams.
+"""
+
+
+def spl_dedup(keys, keepempty=True):
+    """SPL to dedupe on keys server side. With keepempty the events missing one of the keys are passed through
+    instead of dropped, and the client side pass deals with them."""
+    return "| dedup {0}{1} ".format("keepempty=true " if keepempty else "", " ".join(keys))
+
+
+def dedupe_key(row, keys):
+    """Hashes the values of keys in row down to an 8 byte digest. A missing field hashes differently from an empty one."""
+    parts = []
+    for key in keys:
+        value = row.get(key)
+        parts.append('\x00' if value is None else str(value))
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=8).digest()
+
+
+def iter_dedupe(rows, keys, require=False, max_keys=None):
+    """Yields each row the first time its key is seen. With require set, rows missing any of the keys are dropped
+    instead of being keyed on what they do have. With max_keys set, only that many keys are remembered."""
+    if max_keys is None:
+        seen = set()
+        for row in rows:
+            if require and any(row.get(key) is None for key in keys):
+                continue
+            digest = dedupe_key(row, keys)
+            if digest not in seen:
+                seen.add(digest)
+                yield row
+        return
+    seen = OrderedDict()
+    for row in rows:
+        if require and any(row.get(key) is None for key in keys):
+            continue
+        digest = dedupe_key(row, keys)
+        if digest in seen:
+            seen.move_to_end(digest)
+            continue
+        seen[digest] = None
+        if len(seen) > max_keys:
+            seen.popitem(last=False)
+        yield row
+
+
+def dedupe(rows, keys, require=False, max_keys=None):
+    """List version of iter_dedupe."""
+    return list(iter_dedupe(rows, keys, require, max_keys))
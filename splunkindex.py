@@ -0,0 +1,291 @@
+# 10/18/26 GitStoph
+# Local SQLite index of recent events, so lookups don't need a wildcard scan in splunk.
+##################################################
+import os
+import re
+import time
+import sqlite3
+from rich.console import Console
+from splunkdedupe import dedupe_key
+
+"""
+searchdhcp.py looks for its search string anywhere in the description, hostname, IP or MAC, and the only way splunk can
+answer that is a leading wildcard search, which scans every DHCP event in the window. This keeps a local copy of the
+last INDEX_HORIZON seconds of those events instead, in a SQLite file with an FTS5 trigram index on the searched
+columns, so a substring or prefix match of three or more characters is an index lookup that takes milliseconds.
+A sync pulls everything since the last checkpoint off the export endpoint and drops what has aged out of the horizon.
+The checkpoint is set INDEX_LAG seconds before the sync started, so events that get indexed late are picked up by the
+next sync; rows already stored are skipped by their digest. Lookups answer up to the checkpoint from here, and the
+caller searches splunk for anything newer than that, which is a small window and cheap.
+Each kind of event gets its own table, created the first time it's synced, with one TEXT column per field plus the
+event's epoch.
+An IP or a whole MAC is matched as a whole word, the way TERM() matches it in splunk, so 10.2.0.1 doesn't also turn up
+10.2.0.10 through 10.2.0.199. The trigram index still narrows those down first, and only its hits get checked.
+The trigram tokenizer needs SQLite 3.34 or newer built with FTS5, and RHEL7's python 3.6 has 3.7.17. Without it the
+tables are kept without the index and every lookup checks each row in the horizon with LIKE, which is slower but still
+a lot quicker than asking splunk.
+Some lookups only ever want the latest answer, like which hosts a user has logged on to. Those are kept as a map
+instead: one row per key, like user and host, with first_seen and last_seen. The sync pulls a stats summary of just
+the new events, and each summary row is merged into the map. Keys not seen within the horizon are dropped.
+"""
+
+console = Console()
+INDEX_PATH = os.getenv('SPLUNK_INDEX_PATH', os.path.join(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'), 'local_index.sqlite'))
+INDEX_HORIZON = int(os.getenv('SPLUNK_INDEX_HORIZON', '259200'))
+INDEX_LAG = int(os.getenv('SPLUNK_INDEX_LAG', '300'))
+BATCH_SIZE = 5000
+# Splunk's major breakers, what TERM() needs on either side of a value.
+BREAKERS = '\\s\\[\\]<>(){}|!;,\'"*&?+'
+trigram = None
+
+
+def has_word(value, text):
+    """True if text is in value with a major breaker or nothing on either side, case insensitively."""
+    if value is None:
+        return False
+    pattern = '(?<![^{0}]){1}(?![^{0}])'.format(BREAKERS, re.escape(text))
+    return re.search(pattern, value, re.IGNORECASE) is not None
+
+
+def connect():
+    db = sqlite3.connect(INDEX_PATH, timeout=30)
+    db.create_function('has_word', 2, has_word)
+    db.execute('CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, synced REAL)')
+    return db
+
+
+def has_trigram(db):
+    """True if this SQLite can build an FTS5 trigram index. Checked once per run."""
+    global trigram
+    if trigram is None:
+        try:
+            db.execute("CREATE VIRTUAL TABLE temp.trigram_probe USING fts5(probe, tokenize='trigram')")
+            db.execute("DROP TABLE temp.trigram_probe")
+            trigram = True
+        except sqlite3.OperationalError:
+            console.log("[yellow]SQLite {0} can't build a trigram index, the local index will be searched row by row. "
+                        "That needs SQLite 3.34 or newer with FTS5.".format(sqlite3.sqlite_version))
+            trigram = False
+    return trigram
+
+
+def has_index(db, name):
+    """True if the table for name has its trigram index, and this SQLite can read it."""
+    if not has_trigram(db):
+        return False
+    return db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name + '_fts',)).fetchone() is not None
+
+
+def ensure_table(db, name, fields, searchable):
+    """Creates the table for name, its trigram index over the searchable fields, and the triggers that keep the two in
+    step, if they don't exist yet. Without trigram support it's just the table. An index added to a table that already
+    has rows, like after an SQLite upgrade, gets built from them."""
+    columns = ", ".join("{0} TEXT".format(field) for field in fields)
+    search_columns = ", ".join(searchable)
+    new_values = ", ".join("new.{0}".format(field) for field in searchable)
+    old_values = ", ".join("old.{0}".format(field) for field in searchable)
+    with db:
+        db.execute('CREATE TABLE IF NOT EXISTS {0} (id INTEGER PRIMARY KEY, rowkey BLOB UNIQUE, epoch REAL, {1})'.format(name, columns))
+        db.execute('CREATE INDEX IF NOT EXISTS {0}_epoch ON {0} (epoch)'.format(name))
+    if not has_trigram(db):
+        return
+    rebuild = not has_index(db, name)
+    with db:
+        db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {0}_fts USING fts5({1}, content='{0}', content_rowid='id', "
+                   "tokenize='trigram')".format(name, search_columns))
+        if rebuild:
+            db.execute("INSERT INTO {0}_fts ({0}_fts) VALUES ('rebuild')".format(name))
+        db.execute('CREATE TRIGGER IF NOT EXISTS {0}_ai AFTER INSERT ON {0} BEGIN '
+                   'INSERT INTO {0}_fts (rowid, {1}) VALUES (new.id, {2}); END'.format(name, search_columns, new_values))
+        db.execute("CREATE TRIGGER IF NOT EXISTS {0}_ad AFTER DELETE ON {0} BEGIN "
+                   "INSERT INTO {0}_fts ({0}_fts, rowid, {1}) VALUES ('delete', old.id, {2}); END".format(name, search_columns, old_values))
+
+
+def checkpoint(name):
+    """Returns the epoch the table for name is synced up to, or None if it has never been synced, is older than the
+    horizon, or the index can't be read. Only then is it worth answering from here."""
+    try:
+        db = connect()
+        try:
+            row = db.execute('SELECT synced FROM checkpoints WHERE name = ?', (name,)).fetchone()
+        finally:
+            db.close()
+    except sqlite3.Error as error:
+        console.log("[red]Local index unavailable: {0}".format(error))
+        return None
+    if row is None or row[0] < time.time() - INDEX_HORIZON:
+        return None
+    return row[0]
+
+
+def sync_start(name):
+    """Where the next sync of name should start: its checkpoint, or the start of the horizon on the first sync."""
+    synced = checkpoint(name)
+    return int(synced) if synced is not None else int(time.time()) - INDEX_HORIZON
+
+
+def sync(name, fields, searchable, rows, started):
+    """Stores rows from a sync that started at epoch started, prunes everything older than the horizon, and moves the
+    checkpoint up. Each row needs an epoch field as well as fields. Returns how many new rows were stored, counted off
+    the inserts themselves since total_changes would count the FTS trigger writes too, or None if the index couldn't be
+    written, in which case the checkpoint stays where it was."""
+    try:
+        db = connect()
+    except sqlite3.Error as error:
+        console.log("[red]Local index unavailable: {0}".format(error))
+        return None
+    try:
+        ensure_table(db, name, fields, searchable)
+        insert = 'INSERT OR IGNORE INTO {0} (rowkey, epoch, {1}) VALUES (?, ?, {2})'.format(
+            name, ", ".join(fields), ", ".join('?' for _ in fields))
+        added = 0
+        batch = []
+        for row in rows:
+            batch.append([dedupe_key(row, ['epoch'] + fields), float(row.get('epoch', 0))] + [row.get(field) for field in fields])
+            if len(batch) >= BATCH_SIZE:
+                with db:
+                    added += db.executemany(insert, batch).rowcount
+                batch = []
+        if batch:
+            with db:
+                added += db.executemany(insert, batch).rowcount
+        with db:
+            db.execute('DELETE FROM {0} WHERE epoch < ?'.format(name), (time.time() - INDEX_HORIZON,))
+            db.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?)', (name, started - INDEX_LAG))
+        return added
+    except sqlite3.Error as error:
+        console.log("[red]Couldn't update the local index: {0}".format(error))
+        return None
+    finally:
+        db.close()
+
+
+def fts_phrase(text):
+    return '"{0}"'.format(text.replace('"', '""'))
+
+
+def like_pattern(text):
+    return '%{0}%'.format(text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+
+
+def search(name, fields, terms, limit=None):
+    """Returns the rows of name that match any of terms, newest first, as dicts of fields. terms is a list of
+    (columns, text) pairs, and a pair matches when any of its columns contains text, case insensitively like a splunk
+    wildcard. A (columns, text, True) triple only matches text as a whole word, like TERM() in splunk. When all the
+    text is three characters or more, the trigram index picks out the candidates first, otherwise every row in the
+    horizon gets checked. Returns None if the index can't be read, so the caller can search splunk instead."""
+    try:
+        db = connect()
+    except sqlite3.Error as error:
+        console.log("[red]Local index unavailable: {0}".format(error))
+        return None
+    try:
+        conditions = []
+        params = []
+        for term in terms:
+            columns, text, whole = term[0], term[1], len(term) > 2 and term[2]
+            for column in columns:
+                conditions.append("has_word({0}, ?)".format(column) if whole else "{0} LIKE ? ESCAPE '\\'".format(column))
+                params.append(text if whole else like_pattern(text))
+        where = " OR ".join(conditions)
+        if all(len(term[1]) >= 3 for term in terms) and has_index(db, name):
+            match = " OR ".join("{{{0}}} : {1}".format(" ".join(term[0]), fts_phrase(term[1])) for term in terms)
+            where = 'id IN (SELECT rowid FROM {0}_fts WHERE {0}_fts MATCH ?) AND ({1})'.format(name, where)
+            params.insert(0, match)
+        query = 'SELECT {0} FROM {1} WHERE ({2}) AND epoch >= ? ORDER BY epoch DESC'.format(", ".join(fields), name, where)
+        params.append(time.time() - INDEX_HORIZON)
+        if limit:
+            query += ' LIMIT {0}'.format(int(limit))
+        return [dict((k, v) for k, v in zip(fields, row) if v is not None) for row in db.execute(query, params)]
+    except sqlite3.Error as error:
+        console.log("[red]Local index unavailable: {0}".format(error))
+        return None
+    finally:
+        db.close()
+
+
+def sync_map(name, keys, rows, started):
+    """Merges the rows of a `stats min(_time) as first_seen max(_time) as last_seen by <keys>` search into the map for
+    name, keeping the earliest first_seen and the latest last_seen of every key. Then it drops keys that haven't been
+    seen within the horizon and moves the checkpoint up. Keys are matched case insensitively. Each row is inserted if
+    its key is new and then merged into whatever is there, rather than with an upsert, which needs SQLite 3.24. Returns
+    how many rows were merged, or None if the map couldn't be written, in which case the checkpoint stays where it was."""
+    try:
+        db = connect()
+    except sqlite3.Error as error:
+        console.log("[red]Local index unavailable: {0}".format(error))
+        return None
+    try:
+        columns = ", ".join("{0} TEXT COLLATE NOCASE".format(key) for key in keys)
+        with db:
+            db.execute('CREATE TABLE IF NOT EXISTS {0} ({1}, first_seen REAL, last_seen REAL, PRIMARY KEY ({2}))'.format(
+                name, columns, ", ".join(keys)))
+            db.execute('CREATE INDEX IF NOT EXISTS {0}_last_seen ON {0} (last_seen)'.format(name))
+        insert = 'INSERT OR IGNORE INTO {0} ({1}, first_seen, last_seen) VALUES ({2}, ?, ?)'.format(
+            name, ", ".join(keys), ", ".join('?' for _ in keys))
+        update = 'UPDATE {0} SET first_seen = min(first_seen, ?), last_seen = max(last_seen, ?) WHERE {1}'.format(
+            name, " AND ".join("{0} = ?".format(key) for key in keys))
+
+        def merge(batch):
+            with db:
+                db.executemany(insert, [values + seen for values, seen in batch])
+                db.executemany(update, [seen + values for values, seen in batch])
+
+        merged = 0
+        batch = []
+        for row in rows:
+            if any(row.get(key) is None for key in keys):
+                continue
+            batch.append(([row.get(key) for key in keys], [float(row.get('first_seen', 0)), float(row.get('last_seen', 0))]))
+            if len(batch) >= BATCH_SIZE:
+                merge(batch)
+                merged += len(batch)
+                batch = []
+        merge(batch)
+        with db:
+            db.execute('DELETE FROM {0} WHERE last_seen < ?'.format(name), (time.time() - INDEX_HORIZON,))
+            db.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?)', (name, started - INDEX_LAG))
+        return merged + len(batch)
+    except sqlite3.Error as error:
+        console.log("[red]Couldn't update the local index: {0}".format(error))
+        return None
+    finally:
+        db.close()
+
+
+def wildcard_pattern(text):
+    """A splunk style wildcard, where * matches anything, as a LIKE pattern."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_').replace('*', '%')
+
+
+def lookup_map(name, key, values):
+    """Returns the rows of the map for name whose key matches any of values, as dicts, most recently seen first.
+    Values can use * wildcards like in splunk. Everything else is an exact, case insensitive match on the primary key,
+    so a few hundred values at once is still a handful of index lookups. Returns None if the map can't be read."""
+    exact = [value for value in values if '*' not in value]
+    clauses = []
+    params = []
+    if exact:
+        clauses.append('{0} IN ({1})'.format(key, ", ".join('?' for _ in exact)))
+        params += exact
+    for value in values:
+        if '*' in value:
+            clauses.append("{0} LIKE ? ESCAPE '\\'".format(key))
+            params.append(wildcard_pattern(value))
+    if not clauses:
+        return []
+    try:
+        db = connect()
+    except sqlite3.Error as error:
+        console.log("[red]Local index unavailable: {0}".format(error))
+        return None
+    try:
+        cursor = db.execute('SELECT * FROM {0} WHERE ({1}) AND last_seen >= ? ORDER BY last_seen DESC'.format(
+            name, " OR ".join(clauses)), params + [time.time() - INDEX_HORIZON])
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+    except sqlite3.Error as error:
+        console.log("[red]Local index unavailable: {0}".format(error))
+        return None
+    finally:
+        db.close()
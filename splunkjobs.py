@@ -0,0 +1,368 @@
+# 10/18/26 GitStoph
+# Shared search job runner for the splunk scripts.
+##################################################
+import os
+import re
+import time
+import threading
+from itertools import islice
+from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from splunkjson import iter_json_results
+import splunkcache
+import splunkmetrics
+import splunkscheduler
+
+"""
+Every script used to dispatch a job and then spin on job.is_ready() with no sleep at all, which pegs a core and
+sends splunkd back to back REST requests until the job is parsed. This module owns the dispatch/poll loop instead.
+Polling backs off exponentially while the job isn't making progress, dispatch has a timeout, and every job has a
+hard cap on how many REST calls it is allowed to make. The knobs can be overridden in the .env file.
+Results are pulled in pages of PAGE_SIZE rows, a few pages at a time, since a bare job.results() call only ever
+returns Splunk's default page and silently drops the rest. For big pulls where the first row matters more than the
+last, stream_search skips the job entirely and reads rows off the export endpoint as splunkd produces them.
+Results are requested as output_mode=json and parsed by splunkjson, set SPLUNK_RESULTS_PARSER=xml to fall back to
+splunklib's XML ResultsReader.
+If the service is a splunkdaemon.DaemonClient, run_search and stream_search just forward their arguments to the
+daemon, which runs them with its own warm service. splunklib is only imported where it's really needed, so a script
+talking to the daemon never loads it.
+Most lookups only need the first few hits. With a limit, the search gets a head command where the caller says that's
+safe, the job is finalized as soon as resultCount reaches the limit, and only that many rows are fetched.
+A single search with a leading wildcard over -72h mostly runs on a couple of indexers. run_sliced_search splits the
+window into time slices and runs one job per slice, SLICE_JOBS at a time across the whole process, so more of the
+indexer tier gets put to work. Rows come back newest slice first.
+Every job holds one of splunkscheduler's search slots from dispatch until it's cancelled, and is recorded there so
+it gets cancelled even if the script is interrupted. Once the script starts shutting down, or a job is cancelled out
+from under its poll loop, the loop raises splunkscheduler.SearchCancelled at its next poll.
+"""
+
+console = Console()
+POLL_INITIAL = float(os.getenv('SPLUNK_POLL_INITIAL', '0.25'))
+POLL_MAX = float(os.getenv('SPLUNK_POLL_MAX', '5'))
+POLL_FACTOR = 1.5
+DISPATCH_TIMEOUT = float(os.getenv('SPLUNK_DISPATCH_TIMEOUT', '120'))
+MAX_REST_CALLS = int(os.getenv('SPLUNK_MAX_REST_CALLS', '500'))
+PAGE_SIZE = int(os.getenv('SPLUNK_PAGE_SIZE', '5000'))
+FETCH_WORKERS = int(os.getenv('SPLUNK_FETCH_WORKERS', '4'))
+RESULTS_PARSER = os.getenv('SPLUNK_RESULTS_PARSER', 'json')
+SLICE_JOBS = int(os.getenv('SPLUNK_SLICE_JOBS', '4'))
+RELATIVE_TIME = re.compile(r'^-(\d+)([smhd])$')
+TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+slice_slots = threading.BoundedSemaphore(SLICE_JOBS)
+
+
+class SearchJobError(Exception):
+    """Raised when a job doesn't get dispatched in time or blows through its REST call budget."""
+
+
+def next_delay(delay):
+    """Grows the polling delay by POLL_FACTOR, capped at POLL_MAX."""
+    return min(delay * POLL_FACTOR, POLL_MAX)
+
+
+def job_stats(job):
+    """Pulls the progress stats out of the job's last refreshed state. This doesn't make a REST call."""
+    return {"isDone": job["isDone"],
+            "doneProgress": float(job["doneProgress"])*100,
+            "scanCount": int(job["scanCount"]),
+            "eventCount": int(job["eventCount"]),
+            "resultCount": int(job["resultCount"])}
+
+
+def log_job_stats(stats, label=None):
+    """Prints the same progress line the scripts have always printed while a search runs. When several jobs are
+    polled at once, the label says which one the line belongs to."""
+    prefix = "[cyan]{0}   ".format(label) if label else ""
+    console.log(f"{prefix}[purple]{stats['doneProgress']}%   [blue]{stats['scanCount']} scanned   [yellow]{stats['eventCount']} matched   [green]{stats['resultCount']} results")
+
+
+def spl_head(limit):
+    """SPL to stop the search after limit results, or nothing if there's no limit."""
+    return "| head {0} ".format(int(limit)) if limit else ""
+
+
+def wait_for_job(job, done_message="[blue]\n[!] Done!\n", dispatch_timeout=None, max_rest_calls=None, label=None, limit=None):
+    """Waits for the job to be dispatched, then for it to finish. Both waits back off exponentially starting at
+    POLL_INITIAL, growing on every poll up to POLL_MAX, and the delay only starts over once the job is dispatched or
+    finalized. Each is_ready()/refresh() is one REST call; if the job takes longer than dispatch_timeout to leave the
+    queue, or uses up its call budget, it gets cancelled and SearchJobError is raised. The budget is max_rest_calls
+    plus one more for every POLL_MAX seconds the job has been running, so a multi-hour search polled at the normal
+    pace never runs out, and only polling faster than the backoff allows can use it up. Once the job has limit
+    results it's finalized, so it stops scanning and the results it already has become final. Returns the final
+    stats dict."""
+    dispatch_timeout = DISPATCH_TIMEOUT if dispatch_timeout is None else dispatch_timeout
+    max_rest_calls = MAX_REST_CALLS if max_rest_calls is None else max_rest_calls
+    calls = 0
+    delay = POLL_INITIAL
+    started = time.monotonic()
+
+    def spend_call():
+        nonlocal calls
+        calls += 1
+        if splunkscheduler.stopping.is_set():
+            raise splunkscheduler.SearchCancelled("Job {0} was cancelled, the script is exiting.".format(job.sid))
+        if job.sid not in splunkscheduler.jobs:
+            raise splunkscheduler.SearchCancelled("Job {0} was cancelled.".format(job.sid))
+        if calls > max_rest_calls + (time.monotonic() - started) / POLL_MAX:
+            splunkscheduler.cancel(job)
+            raise SearchJobError("Job {0} used up its budget of REST calls after {1} and was cancelled.".format(job.sid, calls))
+
+    # A normal search returns the job's SID right away, so we need to poll for completion
+    spend_call()
+    queued = time.perf_counter()
+    while not job.is_ready():
+        if time.monotonic() - started > dispatch_timeout:
+            splunkscheduler.cancel(job)
+            raise SearchJobError("Job {0} wasn't dispatched within {1}s and was cancelled.".format(job.sid, dispatch_timeout))
+        sleep(delay)
+        delay = next_delay(delay)
+        spend_call()
+    delay = POLL_INITIAL
+    finalized = False
+    running = None
+    while True:
+        stats = job_stats(job)
+        log_job_stats(stats, label)
+        if running is None and job.content.get('dispatchState') not in ('QUEUED', 'PARSING'):
+            running = time.perf_counter()
+            splunkmetrics.add_phase('queue', running - queued, label)
+        if stats["isDone"] == "1":
+            splunkmetrics.add_phase('run', time.perf_counter() - running, label)
+            splunkmetrics.record_job(job, label, rest_calls=calls, finalized=finalized)
+            console.log(done_message)
+            return stats
+        if limit and not finalized and stats["resultCount"] >= limit:
+            console.log("[yellow]{0} results found, finalizing the search early.".format(limit))
+            spend_call()
+            job.finalize()
+            finalized = True
+            delay = POLL_INITIAL
+        sleep(delay)
+        delay = next_delay(delay)
+        spend_call()
+        job.refresh()
+
+
+def run_job(service, query, kwargsearch, done_message="[blue]\n[!] Done!\n", label=None, limit=None):
+    """Dispatches the query with the given kwargs and waits for it to finish. Returns the finished job, the caller is
+    responsible for pulling results and cancelling it with splunkscheduler.cancel. If the wait fails or is
+    interrupted, the job is cancelled here. The first dispatch of the run also cleans up after earlier runs that were
+    killed, see splunkscheduler.reap."""
+    splunkscheduler.reap(service)
+    with splunkmetrics.phase('dispatch', label):
+        job = service.jobs.create(query, **kwargsearch)
+    splunkscheduler.remember(job)
+    try:
+        wait_for_job(job, done_message=done_message, label=label, limit=limit)
+    except BaseException:
+        splunkscheduler.cancel(job)
+        raise
+    return job
+
+
+def read_results(stream, fields=None, parser=None, row_type=None, previews=False):
+    """Generator over the result dicts in a results or export stream, in whichever format RESULTS_PARSER asked
+    splunkd for. Diagnostic messages Splunk mixes into the stream are dropped, only the result dicts are kept. If
+    fields is given, each row only keeps those fields. If row_type is given, each row is built straight into one of
+    those (see splunkrows.record_type) and the parsed dict is thrown away, which makes fields redundant. Preview
+    rows are skipped unless previews is set."""
+    if row_type is not None:
+        for row in read_results(stream, parser=parser, previews=previews):
+            yield row_type(row)
+        return
+    if (parser or RESULTS_PARSER) == 'json':
+        for row in iter_json_results(stream, fields, previews=previews):
+            yield row
+        return
+    import splunklib.results as results
+    reader = results.ResultsReader(stream)
+    for row in reader:
+        if isinstance(row, dict) and (previews or not reader.is_preview):
+            yield row if fields is None else dict((k, row[k]) for k in fields if k in row)
+
+
+def as_rows(rows, row_type=None):
+    """Builds row_type rows out of plain dicts, for results that came from the cache or the daemon."""
+    return rows if row_type is None else [row_type(row) for row in rows]
+
+
+def fetch_page(job, offset, count, fields=None, row_type=None):
+    """Pulls one page of results from a finished job."""
+    start = time.perf_counter()
+    stream = job.results(count=count, offset=offset, output_mode=RESULTS_PARSER)
+    requested = time.perf_counter() - start
+    if splunkmetrics.enabled:
+        stream = splunkmetrics.TimedReader(stream)
+    try:
+        return list(read_results(stream, fields, row_type=row_type))
+    finally:
+        stream.close()
+        if splunkmetrics.enabled:
+            elapsed = time.perf_counter() - start
+            splunkmetrics.add_phase('fetch', requested + stream.seconds, job.sid)
+            splunkmetrics.add_phase('parse', elapsed - requested - stream.seconds, job.sid)
+
+
+def fetch_results(job, result_count=None, page_size=None, workers=None, fields=None, row_type=None):
+    """Reads resultCount off the finished job and pulls every page of it. Pages are requested concurrently over
+    FETCH_WORKERS threads, then stitched back together in offset order so the rows come back exactly as Splunk
+    sorted them."""
+    page_size = page_size or PAGE_SIZE
+    workers = workers or FETCH_WORKERS
+    if result_count is None:
+        result_count = int(job["resultCount"])
+    offsets = list(range(0, result_count, page_size))
+    if len(offsets) == 0:
+        return []
+    if len(offsets) == 1:
+        return fetch_page(job, 0, result_count, fields, row_type)
+    with ThreadPoolExecutor(max_workers=min(workers, len(offsets))) as pool:
+        pages = list(pool.map(lambda offset: fetch_page(job, offset, min(page_size, result_count - offset), fields, row_type), offsets))
+    return [row for page in pages for row in page]
+
+
+def run_search(service, query, kwargsearch, done_message="[blue]\n[!] Done!\n", label=None, fields=None, use_cache=None,
+               limit=None, row_type=None, priority=None):
+    """Runs the query start to finish: dispatch, wait, pull every result, then cancel the job so splunkd can throw
+    away its artifacts. Returns the list of result dicts, or of row_type rows if one is given, at most limit of them
+    if a limit is given. A fresh enough copy in the result cache skips all of that, unless use_cache is False or the
+    cache was turned off for this run. priority is the search slot priority, this run's default if it isn't given,
+    and is passed on to the daemon along with everything else."""
+    use_cache = splunkcache.enabled if use_cache is None else use_cache
+    if row_type is not None:
+        fields = list(row_type.fields)
+    if getattr(service, 'is_daemon', False):
+        with splunkmetrics.phase('daemon', label):
+            return as_rows(service.run_search(query=query, kwargsearch=kwargsearch, done_message=done_message,
+                                              label=label, fields=fields, use_cache=use_cache, limit=limit,
+                                              priority=priority or splunkscheduler.default_priority), row_type)
+    key = splunkcache.cache_key(query, kwargsearch, fields, limit=limit)
+    logs = None
+    if use_cache:
+        with splunkmetrics.phase('cache', label):
+            logs = splunkcache.get(key)
+    if logs is not None:
+        return as_rows(logs, row_type)
+    with splunkscheduler.slot(label, priority):
+        job = run_job(service, query, kwargsearch, done_message=done_message, label=label, limit=limit)
+        try:
+            result_count = int(job["resultCount"])
+            if limit:
+                result_count = min(result_count, limit)
+            logs = fetch_results(job, result_count=result_count, fields=fields, row_type=row_type)
+        finally:
+            splunkscheduler.cancel(job)
+    if use_cache:
+        splunkcache.put(key, query, logs)
+    return logs
+
+
+def stream_search(service, query, kwargsearch, fields=None, limit=None, row_type=None, previews=False, priority=None):
+    """Generator over the rows of an export search. Nothing is buffered here, each row is yielded as soon as it is
+    parsed off the wire, so memory stays flat no matter how many rows come back. Export runs its own job server side,
+    so exec_mode is dropped from the kwargs. Diagnostic messages are skipped, and so are preview rows unless previews
+    is set, which a real-time search needs. With a limit, the stream is closed as soon as that many rows have been read. For metrics, first_row is the wait for the first row and export
+    is the whole stream, including whatever the caller did with each row. priority is as in run_search."""
+    if row_type is not None:
+        fields = list(row_type.fields)
+    if getattr(service, 'is_daemon', False):
+        for row in service.stream_search(query=query, kwargsearch=kwargsearch, fields=fields, limit=limit,
+                                         previews=previews, priority=priority or splunkscheduler.default_priority):
+            yield row if row_type is None else row_type(row)
+        return
+    params = dict((k, v) for k, v in kwargsearch.items() if k != 'exec_mode')
+    params['output_mode'] = RESULTS_PARSER
+    with splunkscheduler.slot('export', priority):
+        start = time.perf_counter()
+        stream = service.jobs.export(query, **params)
+        first = True
+        try:
+            for row in islice(read_results(stream, fields, row_type=row_type, previews=previews), limit or None):
+                if first:
+                    splunkmetrics.add_phase('first_row', time.perf_counter() - start)
+                    first = False
+                yield row
+        finally:
+            stream.close()
+            splunkmetrics.add_phase('export', time.perf_counter() - start)
+
+
+def time_slices(kwargsearch, slices, now=None):
+    """Splits a -N[smhd] to now window into slices of equal length, newest first. Each slice gets absolute epoch
+    bounds so they line up exactly: earliest_time is inclusive and latest_time isn't, so no event lands in two slices.
+    Returns None for any other kind of window."""
+    match = RELATIVE_TIME.match(str(kwargsearch.get('earliest_time', '')))
+    if match is None or kwargsearch.get('latest_time', 'now') != 'now':
+        return None
+    now = int(time.time() if now is None else now)
+    span = int(match.group(1)) * TIME_UNITS[match.group(2)]
+    bounds = [now - span * i // slices for i in range(slices + 1)]
+    return [dict(kwargsearch, earliest_time=str(bounds[i + 1]), latest_time=str(bounds[i])) for i in range(slices)]
+
+
+def run_slice(service, query, kwargsearch, done_message, label, fields, limit, stop, row_type=None):
+    """Runs one slice once a slot is free, unless stop got set while it was waiting. The slots are shared, so two
+    sliced searches running side by side still only keep SLICE_JOBS jobs on splunk between them."""
+    with slice_slots:
+        if stop.is_set():
+            return []
+        return run_search(service, query, kwargsearch, done_message=done_message, label=label, fields=fields,
+                          use_cache=False, limit=limit, row_type=row_type)
+
+
+def iter_sliced_search(service, query, kwargsearch, slices, label=None, fields=None, limit=None, row_type=None):
+    """Generator version of run_sliced_search. Every slice is dispatched up front, and the rows of each slice are
+    yielded as soon as it and every newer slice have finished, so the newest rows can be shown while older slices are
+    still running. Slices that haven't been dispatched yet are dropped if the caller stops reading early."""
+    windows = time_slices(kwargsearch, slices)
+    if windows is None:
+        console.log("[red]Can't slice a {0} to {1} window, running it as one search.".format(
+            kwargsearch.get('earliest_time'), kwargsearch.get('latest_time')))
+        for row in run_search(service, query, kwargsearch, label=label, fields=fields, limit=limit, row_type=row_type):
+            yield row
+        return
+    prefix = "{0} ".format(label) if label else ""
+    console.log("[yellow]{0}Searching in {1} slices, {2} at a time..".format(prefix, len(windows), SLICE_JOBS))
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=min(SLICE_JOBS, len(windows))) as pool:
+        futures = []
+        for n, window in enumerate(windows):
+            slice_label = "{0}slice {1}/{2}".format(prefix, n + 1, len(windows))
+            futures.append(pool.submit(run_slice, service, query, window, "[yellow][!] {0} completed!\n".format(slice_label),
+                                       slice_label, fields, limit, stop, row_type))
+        try:
+            count = 0
+            for future in futures:
+                for row in future.result():
+                    yield row
+                    count += 1
+                    if limit and count >= limit:
+                        return
+        finally:
+            stop.set()
+            for future in futures:
+                future.cancel()
+
+
+def run_sliced_search(service, query, kwargsearch, slices=None, done_message="[blue]\n[!] Done!\n", label=None, fields=None,
+                      use_cache=None, limit=None, row_type=None):
+    """run_search over the window split into slices concurrent jobs. The slices are merged newest first, which is
+    the order splunk returns events in anyway. With slices unset or 1 this is just run_search. The merged rows are
+    cached under the original relative window, so a rerun a minute later still hits the cache."""
+    if not slices or slices < 2:
+        return run_search(service, query, kwargsearch, done_message=done_message, label=label, fields=fields,
+                          use_cache=use_cache, limit=limit, row_type=row_type)
+    use_cache = splunkcache.enabled if use_cache is None else use_cache
+    if row_type is not None:
+        fields = list(row_type.fields)
+    key = splunkcache.cache_key(query, dict(kwargsearch, slices=slices), fields, limit=limit)
+    logs = splunkcache.get(key) if use_cache else None
+    if logs is not None:
+        return as_rows(logs, row_type)
+    logs = list(iter_sliced_search(service, query, kwargsearch, slices, label=label, fields=fields, limit=limit,
+                                   row_type=row_type))
+    console.log(done_message)
+    if use_cache:
+        splunkcache.put(key, query, logs)
+    return logs
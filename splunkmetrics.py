@@ -0,0 +1,130 @@
+# 10/18/26 GitStoph
+# Phase timings and job stats for the splunk scripts.
+##################################################
+import os
+import sys
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from rich.console import Console
+
+"""
+The progress lines from the poll loop don't say where a run actually spends its time. With --metrics, each phase of
+the run is timed: login, dispatch, queue wait, run, results fetch, parse, dedupe and rendering. The job's own
+numbers from the job inspector (sid, runDuration, scanCount, eventCount, resultCount) are captured too. When the
+script finishes, everything is written out as one JSON object, to stderr or appended as one line to a file, so runs
+can be collected and compared later.
+Fetch and parse overlap, since rows are parsed off the wire as they arrive. Fetch is the time spent waiting on the
+connection and parse is the rest. Searches handed to splunkdaemon.py only show up as one daemon phase, since the
+work happens in the daemon's process. Nothing is recorded unless enable() was called, so the timers cost next to
+nothing on a normal run.
+"""
+
+console = Console()
+enabled = False
+started = time.time()
+phases = []
+jobs = []
+lock = threading.Lock()
+
+
+def enable():
+    """Turns on recording for the rest of the run. The scripts call this for --metrics."""
+    global enabled
+    enabled = True
+
+
+def add_phase(name, seconds, label=None):
+    if not enabled:
+        return
+    with lock:
+        phases.append({'phase': name, 'label': label, 'seconds': round(seconds, 6)})
+
+
+@contextmanager
+def phase(name, label=None):
+    """Times the body of the with block as one occurrence of the named phase."""
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, time.perf_counter() - start, label)
+
+
+def timed(name):
+    """Decorator version of phase, for the dedupe and output functions in the scripts."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TimedReader(object):
+    """Wraps a response body and adds up the time spent waiting in read(), which is how fetch gets told apart from
+    parse."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.seconds = 0.0
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        try:
+            return self.stream.read(size)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def close(self):
+        self.stream.close()
+
+
+def record_job(job, label=None, **extra):
+    """Captures the job inspector stats from the job's last refreshed state. This doesn't make a REST call."""
+    if not enabled:
+        return
+    content = job.content
+    stats = {'sid': job.sid, 'label': label}
+    for key in ('dispatchState', 'runDuration', 'scanCount', 'eventCount', 'resultCount'):
+        stats[key] = content.get(key)
+    stats.update(extra)
+    with lock:
+        jobs.append(stats)
+
+
+def summary():
+    """Adds up the phases by name. Phases that ran in parallel are summed, so the totals can exceed the wall time."""
+    totals = {}
+    for entry in phases:
+        total = totals.setdefault(entry['phase'], {'count': 0, 'seconds': 0.0})
+        total['count'] += 1
+        total['seconds'] = round(total['seconds'] + entry['seconds'], 6)
+    return totals
+
+
+def write(path='-'):
+    """Writes the run's metrics as one JSON object. '-' prints it to stderr, so it stays out of the tables and rows on
+    stdout, anything else is a file it gets appended to as one line."""
+    if not enabled:
+        return
+    with lock:
+        report = {'script': os.path.basename(sys.argv[0]), 'argv': sys.argv[1:], 'started': started,
+                  'total_seconds': round(time.time() - started, 6), 'summary': summary(),
+                  'phases': list(phases), 'jobs': list(jobs)}
+    line = json.dumps(report)
+    if path in (None, '-'):
+        print(line, file=sys.stderr, flush=True)
+        return
+    try:
+        with open(path, 'a') as f:
+            f.write(line + '\n')
+        console.log("[green]Metrics written to {0}.".format(path))
+    except OSError as error:
+        console.log("[red]Couldn't write metrics to {0}: {1}".format(path, error))
@@ -0,0 +1,110 @@
+# 10/18/26 GitStoph
+# Plain csv/tsv/jsonl output for the splunk scripts.
+##################################################
+import io
+import os
+import sys
+import csv
+import json
+import time
+
+"""
+The rich tables are great for a screenful of results, but drawing one with borders between every row gets very slow
+past a few thousand rows, and they're useless to pipe into anything else. With --format csv, tsv or jsonl the
+scripts write rows straight to stdout instead, through a big write buffer that's flushed every FLUSH_INTERVAL seconds
+while rows keep coming, and again whenever write() runs out of rows. A live writer, the one --stream and --follow use,
+flushes after every row instead, since the next row might be minutes away.
+Once a script takes over stdout for rows, everything else that would have gone there, the console logs included, goes
+to stderr, so the pipe only ever carries rows. Missing fields are empty in csv and tsv, and left out in jsonl.
+"""
+
+FORMATS = ['table', 'csv', 'tsv', 'jsonl']
+BUFFER_SIZE = 1024 * 1024
+FLUSH_INTERVAL = 0.5
+stdout = None
+
+
+def take_stdout(buffer_size=BUFFER_SIZE):
+    """Returns a buffered text stream on the real stdout, and points sys.stdout at stderr for everything else. Safe
+    to call more than once."""
+    global stdout
+    if stdout is None:
+        sys.stdout.flush()
+        raw = io.FileIO(sys.stdout.fileno(), 'w', closefd=False)
+        stdout = io.TextIOWrapper(io.BufferedWriter(raw, buffer_size), encoding='utf-8', newline='')
+        sys.stdout = sys.stderr
+    return stdout
+
+
+def flat(value):
+    """Turns a value into the text csv and tsv get. Multivalue fields come back as lists and get space separated."""
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ' '.join(value)
+    return value if isinstance(value, str) else str(value)
+
+
+class RowWriter(object):
+    """Writes rows, dicts or splunkrows records, as csv, tsv or jsonl. keys is the column list, and csv/tsv get it as
+    a header line up front. Keyword arguments to write() are fixed values for every row in that call, like which
+    search the rows came from. With live=True every row is flushed as soon as it's written, for sources that can go
+    quiet between rows."""
+
+    def __init__(self, fmt, keys, stream=None, live=False):
+        self.fmt = fmt
+        self.keys = list(keys)
+        self.live = live
+        self.stream = stream or take_stdout()
+        self.last_flush = time.monotonic()
+        self.closed = False
+        self.csv = csv.writer(self.stream, lineterminator='\n') if fmt == 'csv' else None
+        self.write_line(self.keys)
+
+    def write_line(self, values):
+        if self.fmt == 'csv':
+            self.csv.writerow([flat(v) for v in values])
+        elif self.fmt == 'tsv':
+            self.stream.write('\t'.join(flat(v).replace('\t', ' ').replace('\n', ' ').replace('\r', ' ') for v in values) + '\n')
+
+    def write(self, rows, **fixed):
+        """Writes every row, then flushes. Returns how many were written. If whoever is reading stdout goes away, the rest of the
+        rows are dropped quietly."""
+        count = 0
+        if self.closed:
+            return count
+        try:
+            for row in rows:
+                values = [fixed[key] if key in fixed else row.get(key) for key in self.keys]
+                if self.fmt == 'jsonl':
+                    self.stream.write(json.dumps(dict((k, v) for k, v in zip(self.keys, values) if v is not None)) + '\n')
+                else:
+                    self.write_line(values)
+                count += 1
+                if self.live or time.monotonic() - self.last_flush > FLUSH_INTERVAL:
+                    self.flush()
+            if count:
+                self.flush()
+        except BrokenPipeError:
+            self.broken()
+        return count
+
+    def flush(self):
+        self.stream.flush()
+        self.last_flush = time.monotonic()
+
+    def broken(self):
+        """Stops writing after the reader hung up, and points the fd at /dev/null so the final flush at exit doesn't
+        raise again."""
+        self.closed = True
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, self.stream.fileno())
+        os.close(devnull)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.flush()
+        except BrokenPipeError:
+            self.broken()
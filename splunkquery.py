@@ -0,0 +1,105 @@
+# 10/18/26 GitStoph
+# Builds index-friendly search terms for IPs, CIDRs, MACs and hostnames.
+##################################################
+import re
+import ipaddress
+
+"""
+Splunk finds events by looking terms up in each bucket's lexicon, and only decompresses the raw events of buckets
+that have them. A leading wildcard like dest=*host1* can't be looked up, so every event in the window gets read, and
+src_ip=10.0.0.1 gets broken on the dots into 10, 0, 0 and 1, which nearly every event has. TERM(10.0.0.1) looks
+the whole address up as one token instead, and a trailing wildcard like host1* is a cheap lexicon prefix scan.
+Each function here returns two pieces: base, the terms that go in the search itself so the indexers can skip
+buckets, and post, a `| where` or field filter that goes right after it to keep only exact matches. CIDRs are
+narrowed to the octets the whole range shares, e.g. TERM(10.1.*) for 10.1.16.0/20, then checked with cidrmatch.
+Ranges wider than a /8 have nothing to narrow on and only get the cidrmatch.
+"""
+
+MAC_SEPARATORS = re.compile('[.:\\-\\s]')
+
+
+def is_ipaddress(text):
+    """True if text is a single IPv4 address."""
+    try:
+        ipaddress.IPv4Address(text)
+        return True
+    except ValueError:
+        return False
+
+
+def is_cidr(text):
+    """True if text is an IPv4 network like 10.1.0.0/16. Host bits set, like 10.1.2.3/16, are fine."""
+    if '/' not in text:
+        return False
+    try:
+        ipaddress.IPv4Network(text, strict=False)
+        return True
+    except ValueError:
+        return False
+
+
+def mac_digits(text):
+    """The twelve hex digits of a MAC in any of the usual formats, uppercase, or None if text isn't a whole MAC."""
+    digits = MAC_SEPARATORS.sub('', text).upper()
+    if len(digits) == 12 and all(c in '0123456789ABCDEF' for c in digits):
+        return digits
+    return None
+
+
+def term(value):
+    return "TERM({0})".format(value)
+
+
+def quote(value):
+    """value as an SPL string literal."""
+    return '"{0}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def ip_prefix(network):
+    """The TERM with a trailing wildcard that covers every address in network, or None if it's wider than a /8."""
+    octets = network.prefixlen // 8
+    if octets == 0:
+        return None
+    if octets == 4:
+        return term(network.network_address)
+    return term(".".join(str(network.network_address).split('.')[:octets]) + ".*")
+
+
+def ip_filter(field, value, rex=None):
+    """base and post for field matching an IP or a CIDR. Anything else is matched on the field as it is. If the IP is
+    only somewhere in the text of the event, rex is the rex command that pulls it out into field for the cidrmatch,
+    and a single IP is just its TERM."""
+    if is_cidr(value):
+        network = ipaddress.IPv4Network(value, strict=False)
+        prefix = ip_prefix(network)
+        base = "{0} ".format(prefix) if prefix else ("" if rex else "{0}=* ".format(field))
+        return base, "{0}| where cidrmatch({1}, {2}) ".format(rex or "", quote(str(network)), field)
+    if is_ipaddress(value):
+        return ("{0} ".format(term(value)) if rex else "{0} {1}={2} ".format(term(value), field, value)), ""
+    return "{0}={1} ".format(field, value), ""
+
+
+def any_term(values):
+    """base for any of values, all plain IPs, like the checkfw.py batch searches. The TERMs only narrow the buckets,
+    the caller still filters on the fields."""
+    return "({0}) ".format(" OR ".join(term(value) for value in values))
+
+
+def user_filter(field, value):
+    """base and post for a username that may be logged with a domain in front, like corp\\user1. The field filter
+    matches any user ending in value, so smith still finds corp\\jsmith. When value has the domain in it, the name after
+    it is known to be whole, and is a term of its own in the lexicon, so it's added to narrow the search first."""
+    name = value.split('\\')[-1]
+    if '\\' not in value or '*' in value or not name:
+        return '{0}=*{1} '.format(field, value), ""
+    return '{0} {1}=*{2} '.format(quote(name), field, value), ""
+
+
+def text_filter(fields, value, extra=None):
+    """base and post for free text like a hostname or a partial MAC, matched in any of fields. The search looks for
+    words that start with value, which the lexicon answers, and the post filter keeps the fields that contain it.
+    extra is another spelling to try as well, like the MAC formatted the way that log writes them."""
+    spellings = [value] + ([extra] if extra and extra.lower() != value.lower() else [])
+    base = "({0}) ".format(" OR ".join(quote(spelling + '*') for spelling in spellings))
+    post = "| search {0} ".format(" OR ".join('{0}=*{1}*'.format(field, spelling) for field in fields for spelling in spellings))
+    return base, post
@@ -0,0 +1,57 @@
+# 10/18/26 GitStoph
+# Compact fixed-schema rows for big result sets.
+##################################################
+import sys
+
+"""
+A result row as a dict costs several hundred bytes before counting a single value, and a big firewall pull keeps
+tens of thousands of them around until the table is printed. record_type builds a class with __slots__ for a fixed
+list of fields instead, so each row is one small object holding only the fields the output actually shows. Values
+of low cardinality fields like host, zone or action can be interned so every row shares the same few strings.
+Missing fields are stored as None and only turned into a placeholder when the row is rendered, through get().
+"""
+
+
+class Record(object):
+    """Base class for the row types built by record_type. Reads like a read-only dict for the handful of things the
+    scripts do with a row: get, [], in, and as_dict to turn it back into a plain dict for JSON."""
+    __slots__ = ()
+    fields = ()
+    interned = frozenset()
+
+    def __init__(self, row):
+        for field in self.fields:
+            value = row.get(field)
+            if field in self.interned and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, field, value)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self.fields else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def as_dict(self):
+        """The row as a dict of the fields it has, the same shape run_search returns without a row type."""
+        return dict((field, getattr(self, field)) for field in self.fields if getattr(self, field) is not None)
+
+    def __repr__(self):
+        return "{0}({1!r})".format(type(self).__name__, self.as_dict())
+
+
+def record_type(name, fields, interned=()):
+    """Builds a Record subclass with one slot per field. Every field has to be a valid attribute name that doesn't
+    clash with the Record methods."""
+    for field in fields:
+        if not field.isidentifier() or hasattr(Record, field):
+            raise ValueError("{0} can't be used as a record field.".format(field))
+    return type(name, (Record,), {'__slots__': tuple(fields), 'fields': tuple(fields),
+                                  'interned': frozenset(interned)})
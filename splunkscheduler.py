@@ -0,0 +1,278 @@
+# 10/18/26 GitStoph
+# Client side search slots and orphaned job cleanup for the splunk scripts.
+##################################################
+import os
+import re
+import time
+import heapq
+import fcntl
+import atexit
+import signal
+import sqlite3
+import itertools
+import threading
+from contextlib import contextmanager
+from rich.console import Console
+import splunkmetrics
+
+"""
+Splunk only lets each user run so many searches at once (srchJobsQuota on the role). When a few analysts and a batch
+run all dispatch at the same time, the extra jobs get queued or refused server side, and nobody's lookup comes back.
+Every job now has to hold a slot first. Slots are lock files in SCHED_DIR, MAX_JOBS of them per splunk user and
+host, so every script and every analyst on the box shares them. A lock belongs to the open file, so a script that
+dies frees its slots with it. flock doesn't need write access, so the slot files are opened read only and made
+readable by everyone, and SCHED_DIR is made sticky and world writable like /tmp whatever the umask, so any analyst
+can add files to it but not remove anyone else's. Runs marked as batch, like checkfw.py -b or the --sync runs, can
+only take MAX_JOBS - BATCH_RESERVE of them, which keeps a slot free for interactive lookups. Inside one script the waiting
+searches get the slots in priority order, then first come first served.
+Jobs used to be left running on splunk whenever a script died before job.cancel(). Every dispatched job is now
+recorded until it's cancelled, in memory and in a small SQLite registry, one per Unix user, since another
+analyst's process can't be checked on or have its jobs cancelled anyway. Ctrl + C, SIGTERM, SIGHUP and a normal
+exit all cancel whatever is still running, and the polling threads stop at their next poll. If a script was killed
+outright, the next run finds its jobs in the registry under a pid that no longer exists and cancels them. Export
+searches aren't recorded, since splunkd ends those itself when the connection drops.
+Set SPLUNK_MAX_JOBS=0 to turn the slots off. Any trouble with the lock files or the registry just means no slots or
+no registry for that run.
+"""
+
+console = Console()
+SCHED_DIR = os.getenv('SPLUNK_SCHED_DIR', os.path.join(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'), 'scheduler'))
+MAX_JOBS = int(os.getenv('SPLUNK_MAX_JOBS', '3'))
+BATCH_RESERVE = int(os.getenv('SPLUNK_BATCH_RESERVE', '1'))
+SLOT_POLL = 0.5
+PRIORITIES = {'interactive': 0, 'batch': 1}
+default_priority = 'interactive'
+enabled = True
+stopping = threading.Event()
+jobs = {}
+owners = {}
+waiting = []
+counter = itertools.count()
+condition = threading.Condition()
+reaped = False
+prepared = False
+
+
+class SearchCancelled(Exception):
+    """Raised in the search threads once the script has started shutting down."""
+
+
+def set_priority(priority):
+    """Sets the priority of every search this run dispatches, 'interactive' or 'batch'."""
+    global default_priority
+    default_priority = priority
+
+
+def identity():
+    """The splunk user and host whose quota the slots stand for, safe to use in a file name."""
+    return re.sub(r'[^A-Za-z0-9_.@-]', '_', "{0}@{1}_{2}".format(os.getenv('SPLUNK_USER'), os.getenv('SPLUNK_HOST'), os.getenv('SPLUNK_PORT')))
+
+
+def disable(reason):
+    global enabled
+    if enabled:
+        console.log("[red]Search slots unavailable, searches won't be queued: {0}".format(reason))
+    enabled = False
+
+
+def prepare():
+    """Creates SCHED_DIR once per run. makedirs goes through the umask, so the mode is set explicitly after, unless
+    someone else owns the directory, in which case it's theirs to set up (1777, or setgid to a group every analyst is
+    in)."""
+    global prepared
+    if prepared:
+        return
+    os.makedirs(SCHED_DIR, exist_ok=True)
+    if os.stat(SCHED_DIR).st_uid == os.getuid():
+        os.chmod(SCHED_DIR, 0o1777)
+    prepared = True
+
+
+def slot_file(n):
+    """Opens slot file n read only, creating it readable by everyone if it isn't there yet."""
+    path = os.path.join(SCHED_DIR, "{0}.slot{1}".format(identity(), n))
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        os.fchmod(fd, 0o644)
+        return fd
+    except FileExistsError:
+        return os.open(path, os.O_RDONLY)
+
+
+def try_lock(limit):
+    """Takes the first free slot out of limit, and returns its file descriptor, or None if they're all taken."""
+    prepare()
+    for n in range(limit):
+        fd = slot_file(n)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+
+@contextmanager
+def slot(label=None, priority=None):
+    """Holds one search slot for the body of the with block, waiting for one if they're all taken."""
+    if not enabled or MAX_JOBS <= 0:
+        yield
+        return
+    rank = PRIORITIES[priority or default_priority]
+    limit = MAX_JOBS if rank == 0 else max(1, MAX_JOBS - BATCH_RESERVE)
+    ticket = (rank, next(counter))
+    fd = None
+    start = time.perf_counter()
+    with condition:
+        heapq.heappush(waiting, ticket)
+    try:
+        logged = False
+        while fd is None:
+            if stopping.is_set():
+                raise SearchCancelled("The script is exiting, {0} wasn't dispatched.".format(label or 'the search'))
+            with condition:
+                if waiting[0] == ticket:
+                    try:
+                        fd = try_lock(limit)
+                    except OSError as error:
+                        disable(error)
+                        break
+                    if fd is not None:
+                        heapq.heappop(waiting)
+                        condition.notify_all()
+                        break
+                if not logged:
+                    console.log("[yellow]{0}Waiting for a free search slot, {1} allowed at once..".format(
+                        "{0} ".format(label) if label else "", limit))
+                    logged = True
+                condition.wait(SLOT_POLL)
+        splunkmetrics.add_phase('slot', time.perf_counter() - start, label)
+        yield
+    finally:
+        with condition:
+            if ticket in waiting:
+                waiting.remove(ticket)
+                heapq.heapify(waiting)
+            condition.notify_all()
+        if fd is not None:
+            os.close(fd)
+
+
+def connect():
+    db = sqlite3.connect(os.path.join(SCHED_DIR, 'jobs.{0}.sqlite'.format(os.getuid())), timeout=10)
+    db.execute('CREATE TABLE IF NOT EXISTS jobs (sid TEXT PRIMARY KEY, identity TEXT, pid INTEGER, created REAL)')
+    return db
+
+
+def persist(statement, params):
+    try:
+        prepare()
+        db = connect()
+        try:
+            with db:
+                db.execute(statement, params)
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as error:
+        console.log("[red]Job registry unavailable: {0}".format(error))
+
+
+def remember(job):
+    """Records a job that was just dispatched, and the thread that dispatched it, until forget() is called for it."""
+    jobs[job.sid] = job
+    owners[job.sid] = threading.current_thread()
+    persist('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)', (job.sid, identity(), os.getpid(), time.time()))
+
+
+def forget(sid):
+    jobs.pop(sid, None)
+    owners.pop(sid, None)
+    persist('DELETE FROM jobs WHERE sid = ?', (sid,))
+
+
+def cancel(job):
+    """Cancels the job on splunk and forgets it. Jobs that were already cancelled are left alone."""
+    if job.sid not in jobs:
+        return
+    try:
+        job.cancel()
+    finally:
+        forget(job.sid)
+
+
+def cancel_owned(owner):
+    """Cancels every job the thread owner dispatched that's still running, like the ones splunkdaemon.py is running
+    for a client that hung up. Its poll loop stops at the next poll."""
+    for sid, job in list(jobs.items()):
+        if owners.get(sid) is owner:
+            try:
+                cancel(job)
+                console.log("[yellow]Cancelled search job {0}.".format(sid))
+            except Exception as error:
+                console.log("[red]Couldn't cancel search job {0}: {1}".format(sid, error))
+
+
+def cancel_all():
+    """Stops the search threads and cancels every job this run still has on splunk."""
+    stopping.set()
+    with condition:
+        condition.notify_all()
+    for job in list(jobs.values()):
+        try:
+            cancel(job)
+            console.log("[yellow]Cancelled search job {0}.".format(job.sid))
+        except Exception as error:
+            console.log("[red]Couldn't cancel search job {0}: {1}".format(job.sid, error))
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def reap(service):
+    """Cancels the jobs earlier runs left behind when they were killed, once per run. Only jobs of this splunk user
+    and host whose process is gone are touched."""
+    global reaped
+    if reaped:
+        return
+    reaped = True
+    try:
+        db = connect()
+        try:
+            rows = db.execute('SELECT sid, pid FROM jobs WHERE identity = ?', (identity(),)).fetchall()
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError):
+        return
+    orphans = [sid for sid, pid in rows if not alive(pid)]
+    if not orphans:
+        return
+    from splunklib.client import Job
+    for sid in orphans:
+        try:
+            Job(service, sid).cancel()
+        except Exception as error:
+            console.log("[red]Couldn't cancel orphaned search job {0}: {1}".format(sid, error))
+        forget(sid)
+    console.log("[yellow]Cancelled {0} search jobs left running by earlier runs.".format(len(orphans)))
+
+
+def interrupted(signum, frame):
+    cancel_all()
+    if signum == signal.SIGINT:
+        raise KeyboardInterrupt
+    raise SystemExit(128 + signum)
+
+
+atexit.register(cancel_all)
+if threading.current_thread() is threading.main_thread():
+    for signum, default in ((signal.SIGINT, signal.default_int_handler), (signal.SIGTERM, signal.SIG_DFL),
+                            (signal.SIGHUP, signal.SIG_DFL)):
+        if signal.getsignal(signum) is default:
+            signal.signal(signum, interrupted)
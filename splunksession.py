@@ -0,0 +1,108 @@
+# 10/18/26 GitStoph
+# Session reuse and pooled connections for the splunk scripts.
+##################################################
+import os
+import json
+import time
+import atexit
+import warnings
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InsecureRequestWarning
+import splunklib.binding as binding
+import splunklib.client as client
+from rich.console import Console
+
+"""
+client.connect logs in with the username and password on every run, and splunklib's default handler opens a new
+connection (and TLS handshake) for every single REST call, then sends Connection: Close. That's a noticeable chunk of
+a short 15m lookup before the search is even dispatched.
+build_service here reuses the session key from the last run if it's younger than SESSION_TTL, and routes every REST
+call through one keep-alive requests.Session, so a run pays for one handshake per pooled connection instead of one per
+request. autologin stays on, so if the cached key has expired server side, splunklib logs in again on the 401 and
+retries, and the fresh key gets written back to the session file on the way out.
+The session file holds a live credential, so it's kept in the user's home directory and only readable by them.
+"""
+
+console = Console()
+SESSION_PATH = os.path.expanduser(os.getenv('SPLUNK_SESSION_PATH', '~/.splunkscripts_session'))
+SESSION_TTL = float(os.getenv('SPLUNK_SESSION_TTL', '3000'))
+POOL_SIZE = int(os.getenv('SPLUNK_POOL_SIZE', '10'))
+USER_AGENT = 'splunk-sdk-python/1.6.13'
+
+
+def pooled_handler(verify=False, pool_size=POOL_SIZE):
+    """Returns a splunklib HTTP handler that keeps connections open and shares them across every request and thread in
+    the run. It follows the handler contract in splunklib.binding.HttpLib: take a url and a message dict, return the
+    status, reason, headers and a readable body. Bodies are streamed, so export searches still arrive row by row, and a
+    connection goes back to the pool once its body has been read to the end. verify is passed on every request, since
+    requests lets REQUESTS_CA_BUNDLE or CURL_CA_BUNDLE override the session's own setting. splunklib's handler never
+    checked certificates, so with verify off urllib3's warning about it is silenced instead of printed on every call."""
+    if not verify:
+        warnings.filterwarnings('ignore', category=InsecureRequestWarning)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.verify = verify
+
+    def request(url, message, **kwargs):
+        headers = {'User-Agent': USER_AGENT, 'Accept': '*/*'}
+        for key, value in message['headers']:
+            headers[key] = value
+        response = session.request(message.get('method', 'GET'), url, data=message.get('body', ''),
+                                   headers=headers, stream=True, allow_redirects=False, verify=verify)
+        response.raw.decode_content = True
+        return {
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': list(response.raw.headers.items()),
+            'body': binding.ResponseReader(response.raw),
+        }
+
+    return request
+
+
+def session_id():
+    """Which splunk and which user a cached session key belongs to."""
+    return "{0}@{1}:{2}".format(os.getenv('SPLUNK_USER'), os.getenv('SPLUNK_HOST'), os.getenv('SPLUNK_PORT'))
+
+
+def load_token():
+    """Returns the cached session key if it belongs to this host and user and hasn't expired, otherwise None."""
+    try:
+        with open(SESSION_PATH) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('id') != session_id() or cached.get('expires', 0) < time.time():
+        return None
+    return cached.get('token')
+
+
+def save_token(token):
+    """Writes the session key out for the next run. Splunk's session timeout is idle based, so every save pushes the
+    expiry out by SESSION_TTL again."""
+    try:
+        fd = os.open(SESSION_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'id': session_id(), 'token': token, 'expires': time.time() + SESSION_TTL}, f)
+    except OSError as error:
+        console.log("[red]Couldn't save the splunk session: {0}".format(error))
+
+
+def build_service():
+    """Builds the service object from the .env settings, reusing a cached session key when there is one and logging in
+    when there isn't. The key in use at exit is saved for the next run."""
+    service = client.Service(handler=pooled_handler(),
+                             host=os.getenv('SPLUNK_HOST'),
+                             port=os.getenv('SPLUNK_PORT'),
+                             scheme=os.getenv('SPLUNK_SCHEME'),
+                             username=os.getenv('SPLUNK_USER'),
+                             password=os.getenv('SPLUNK_PASS'),
+                             token=load_token(),
+                             autologin=True)
+    if service.token is binding._NoAuthenticationToken:
+        service.login()
+    atexit.register(lambda: save_token(str(service.token)))
+    return service
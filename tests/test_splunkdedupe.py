@@ -0,0 +1,59 @@
+# 10/18/26 GitStoph
+# Checks the field-keyed dedupe in splunkdedupe.
+##################################################
+import os
+import sys
+import unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from splunkdedupe import dedupe, dedupe_key, iter_dedupe, spl_dedup
+
+
+class DedupeTest(unittest.TestCase):
+
+    def test_keeps_first_of_each_key(self):
+        rows = [{'a': '1', 'b': 'x', 'n': 1}, {'a': '1', 'b': 'x', 'n': 2}, {'a': '1', 'b': 'y', 'n': 3}]
+        self.assertEqual([row['n'] for row in dedupe(rows, ['a', 'b'])], [1, 3])
+
+    def test_other_fields_dont_matter(self):
+        rows = [{'a': '1', 'extra': 'x'}, {'a': '1', 'extra': 'y'}]
+        self.assertEqual(len(dedupe(rows, ['a'])), 1)
+
+    def test_missing_is_not_empty(self):
+        self.assertNotEqual(dedupe_key({'a': ''}, ['a']), dedupe_key({}, ['a']))
+        self.assertEqual(len(dedupe([{'a': ''}, {}], ['a'])), 2)
+
+    def test_values_dont_run_together(self):
+        self.assertNotEqual(dedupe_key({'a': 'ab', 'b': 'c'}, ['a', 'b']), dedupe_key({'a': 'a', 'b': 'bc'}, ['a', 'b']))
+
+    def test_require_drops_rows_missing_a_key(self):
+        rows = [{'user': 'u1', 'host': 'h1'}, {'user': 'u1'}, {'user': 'u2', 'host': None}, {'user': 'u2', 'host': 'h2'}]
+        self.assertEqual(dedupe(rows, ['user', 'host'], require=True), [rows[0], rows[3]])
+        self.assertEqual(len(dedupe(rows, ['user', 'host'])), 4)
+
+    def test_require_with_max_keys(self):
+        rows = [{'a': '1'}, {'b': '2'}, {'a': '1'}]
+        self.assertEqual(dedupe(rows, ['a'], require=True, max_keys=10), [rows[0]])
+
+    def test_iter_dedupe_is_lazy(self):
+        def rows():
+            yield {'a': '1'}
+            raise AssertionError("read past the first row")
+        self.assertEqual(next(iter_dedupe(rows(), ['a'])), {'a': '1'})
+
+    def test_max_keys_forgets_least_recently_seen(self):
+        rows = [{'a': v} for v in ['1', '2', '3', '1']]
+        self.assertEqual([row['a'] for row in dedupe(rows, ['a'], max_keys=2)], ['1', '2', '3', '1'])
+        self.assertEqual([row['a'] for row in dedupe(rows, ['a'], max_keys=3)], ['1', '2', '3'])
+
+    def test_max_keys_refreshes_a_key_on_repeat(self):
+        # 1 is seen again before 3 arrives, so 2 is the one forgotten, and 1 stays a duplicate.
+        rows = [{'a': v} for v in ['1', '2', '1', '3', '1', '2']]
+        self.assertEqual([row['a'] for row in dedupe(rows, ['a'], max_keys=2)], ['1', '2', '3', '2'])
+
+    def test_spl_dedup(self):
+        self.assertEqual(spl_dedup(['a', 'b']), "| dedup keepempty=true a b ")
+        self.assertEqual(spl_dedup(['a'], keepempty=False), "| dedup a ")
+
+
+if __name__ == '__main__':
+    unittest.main()
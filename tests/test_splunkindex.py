@@ -0,0 +1,99 @@
+# 10/18/26 GitStoph
+# Checks splunkindex sync, search and the user to host map against a throwaway SQLite file.
+##################################################
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import splunkindex
+
+FIELDS = ['hostname', 'ip', 'mac']
+
+
+def dhcp_rows(count, now):
+    return [{'epoch': now - n, 'hostname': 'host{0}'.format(n), 'ip': '10.2.0.{0}'.format(n % 250),
+             'mac': 'AA:BB:CC:00:{0:02X}:{1:02X}'.format(n // 256, n % 256)} for n in range(count)]
+
+
+class IndexTestCase(unittest.TestCase):
+    """Points the index at a fresh file for each test. trigram is None to use whatever this SQLite supports, or False
+    to force the row by row fallback."""
+    trigram = None
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = splunkindex.INDEX_PATH, splunkindex.trigram
+        splunkindex.INDEX_PATH = os.path.join(self.directory, 'index.sqlite')
+        splunkindex.trigram = self.trigram
+
+    def tearDown(self):
+        splunkindex.INDEX_PATH, splunkindex.trigram = self.saved
+        shutil.rmtree(self.directory)
+
+
+class SyncTest(IndexTestCase):
+
+    def test_counts_only_new_rows(self):
+        now = time.time()
+        rows = dhcp_rows(300, now)
+        self.assertEqual(splunkindex.sync('dhcp', FIELDS, FIELDS, rows, now), 300)
+        self.assertEqual(splunkindex.sync('dhcp', FIELDS, FIELDS, rows + dhcp_rows(1, now + 1), now), 1)
+
+    def test_counts_across_batches(self):
+        now = time.time()
+        count = splunkindex.BATCH_SIZE + 10
+        self.assertEqual(splunkindex.sync('dhcp', FIELDS, FIELDS, iter(dhcp_rows(count, now)), now), count)
+
+    def test_prunes_and_checkpoints(self):
+        now = time.time()
+        old = dict(dhcp_rows(1, now)[0], epoch=now - splunkindex.INDEX_HORIZON - 10, hostname='oldhost')
+        self.assertEqual(splunkindex.sync('dhcp', FIELDS, FIELDS, [old] + dhcp_rows(2, now), now), 3)
+        self.assertEqual(splunkindex.search('dhcp', FIELDS, [(['hostname'], 'oldhost')]), [])
+        self.assertEqual(splunkindex.checkpoint('dhcp'), now - splunkindex.INDEX_LAG)
+
+    def test_search_substring_and_whole_word(self):
+        now = time.time()
+        splunkindex.sync('dhcp', FIELDS, FIELDS, dhcp_rows(20, now), now)
+        self.assertEqual([row['hostname'] for row in splunkindex.search('dhcp', FIELDS, [(['hostname'], 'ST1')])],
+                         ['host1'] + ['host{0}'.format(n) for n in range(10, 20)])
+        self.assertEqual([row['ip'] for row in splunkindex.search('dhcp', FIELDS, [(['ip'], '10.2.0.1', True)])],
+                         ['10.2.0.1'])
+        self.assertEqual(len(splunkindex.search('dhcp', FIELDS, [(['hostname'], 'host')], limit=5)), 5)
+        self.assertEqual(splunkindex.search('dhcp', FIELDS, [(['mac'], 'aa:bb:cc:00:00:13', True)])[0]['hostname'], 'host19')
+
+
+class SyncFallbackTest(SyncTest):
+    trigram = False
+
+
+class SyncMapTest(IndexTestCase):
+
+    def test_merges_first_and_last_seen(self):
+        now = time.time()
+        rows = [{'user': 'jsmith', 'host': 'ws1', 'first_seen': now - 100, 'last_seen': now - 50},
+                {'user': 'jsmith', 'host': 'ws2', 'first_seen': now - 30, 'last_seen': now - 20}]
+        self.assertEqual(splunkindex.sync_map('winuser', ['user', 'host'], rows, now), 2)
+        later = [{'user': 'JSMITH', 'host': 'WS1', 'first_seen': now - 10, 'last_seen': now - 5},
+                 {'user': 'nohost', 'first_seen': now, 'last_seen': now}]
+        self.assertEqual(splunkindex.sync_map('winuser', ['user', 'host'], later, now), 1)
+        found = splunkindex.lookup_map('winuser', 'user', ['jsmith'])
+        self.assertEqual([(row['host'], row['first_seen'], row['last_seen']) for row in found],
+                         [('ws1', now - 100, now - 5), ('ws2', now - 30, now - 20)])
+
+    def test_wildcards_and_horizon(self):
+        now = time.time()
+        rows = [{'user': 'jsmith', 'host': 'ws1', 'first_seen': now, 'last_seen': now},
+                {'user': 'asmith', 'host': 'ws2', 'first_seen': now, 'last_seen': now},
+                {'user': 'gone', 'host': 'ws3', 'first_seen': 0, 'last_seen': now - splunkindex.INDEX_HORIZON - 10}]
+        splunkindex.sync_map('winuser', ['user', 'host'], rows, now)
+        self.assertEqual(sorted(row['user'] for row in splunkindex.lookup_map('winuser', 'user', ['*smith'])),
+                         ['asmith', 'jsmith'])
+        self.assertEqual(splunkindex.lookup_map('winuser', 'user', ['gone']), [])
+        self.assertEqual(splunkindex.lookup_map('winuser', 'user', []), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# 10/18/26 GitStoph
+# Checks that splunkjson yields export rows as they arrive, not once a whole chunk has.
+##################################################
+import os
+import io
+import sys
+import json
+import threading
+import unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import splunklib.binding as binding
+from splunkjson import iter_json_results
+
+
+def export_line(n):
+    return (json.dumps({'preview': False, 'result': {'n': str(n)}}) + '\n').encode('utf-8')
+
+
+class TrickleTest(unittest.TestCase):
+    """The export rows go down a pipe, and the second one is only written once the first has come out of the parser,
+    or after a timeout. If the parser waited for a full chunk before decoding, the first row would only come out once
+    the pipe was closed."""
+
+    def trickle(self, wrap):
+        r, w = os.pipe()
+        stream = wrap(io.open(r, 'rb'))
+        first_row = threading.Event()
+        finishing = threading.Event()
+
+        def writer():
+            os.write(w, export_line(1))
+            first_row.wait(5)
+            finishing.set()
+            os.write(w, export_line(2))
+            os.close(w)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        rows = []
+        try:
+            for row in iter_json_results(stream):
+                if not rows:
+                    self.assertFalse(finishing.is_set(), "the first row only came out once the stream ended")
+                    first_row.set()
+                rows.append(row)
+        finally:
+            first_row.set()
+            thread.join()
+            stream.close()
+        self.assertEqual(rows, [{'n': '1'}, {'n': '2'}])
+
+    def test_buffered_stream(self):
+        self.trickle(lambda f: f)
+
+    def test_splunklib_response_reader(self):
+        self.trickle(binding.ResponseReader)
+
+
+if __name__ == '__main__':
+    unittest.main()
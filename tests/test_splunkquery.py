@@ -0,0 +1,101 @@
+# 10/18/26 GitStoph
+# Checks the search terms splunkquery builds for IPs, CIDRs, MACs, usernames and free text.
+##################################################
+import os
+import sys
+import unittest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from splunkquery import ip_filter, is_cidr, is_ipaddress, mac_digits, text_filter, user_filter
+
+
+class IpFilterTest(unittest.TestCase):
+
+    def test_single_ip(self):
+        self.assertEqual(ip_filter('src_ip', '10.0.0.1'), ("TERM(10.0.0.1) src_ip=10.0.0.1 ", ""))
+
+    def test_single_ip_with_rex(self):
+        self.assertEqual(ip_filter('ip', '10.0.0.1', rex='| rex "(?<ip>\\S+)" '), ("TERM(10.0.0.1) ", ""))
+
+    def test_not_an_ip(self):
+        self.assertEqual(ip_filter('src_ip', 'host1'), ("src_ip=host1 ", ""))
+
+    def test_slash_32(self):
+        self.assertEqual(ip_filter('src_ip', '10.0.0.1/32'),
+                         ("TERM(10.0.0.1) ", '| where cidrmatch("10.0.0.1/32", src_ip) '))
+
+    def test_slash_24(self):
+        self.assertEqual(ip_filter('src_ip', '10.1.2.0/24')[0], "TERM(10.1.2.*) ")
+
+    def test_slash_20_only_shares_two_octets(self):
+        self.assertEqual(ip_filter('src_ip', '10.1.16.0/20'),
+                         ("TERM(10.1.*) ", '| where cidrmatch("10.1.16.0/20", src_ip) '))
+
+    def test_host_bits_are_dropped(self):
+        self.assertEqual(ip_filter('src_ip', '10.1.2.3/16')[1], '| where cidrmatch("10.1.0.0/16", src_ip) ')
+
+    def test_slash_8(self):
+        self.assertEqual(ip_filter('src_ip', '10.0.0.0/8'),
+                         ("TERM(10.*) ", '| where cidrmatch("10.0.0.0/8", src_ip) '))
+
+    def test_wider_than_slash_8_has_no_term(self):
+        self.assertEqual(ip_filter('src_ip', '10.0.0.0/7'),
+                         ("src_ip=* ", '| where cidrmatch("10.0.0.0/7", src_ip) '))
+
+    def test_slash_0(self):
+        self.assertEqual(ip_filter('src_ip', '0.0.0.0/0'),
+                         ("src_ip=* ", '| where cidrmatch("0.0.0.0/0", src_ip) '))
+        self.assertEqual(ip_filter('ip', '0.0.0.0/0', rex='| rex x ')[0], "")
+
+    def test_is_ipaddress_and_cidr(self):
+        self.assertTrue(is_ipaddress('10.0.0.1'))
+        self.assertFalse(is_ipaddress('10.0.0.256'))
+        self.assertFalse(is_ipaddress('10.0.0.0/8'))
+        self.assertTrue(is_cidr('10.0.0.0/8'))
+        self.assertFalse(is_cidr('10.0.0.1'))
+        self.assertFalse(is_cidr('10.0.0.0/33'))
+
+
+class MacDigitsTest(unittest.TestCase):
+
+    def test_formats(self):
+        for text in ['aa:bb:cc:dd:ee:ff', 'AA-BB-CC-DD-EE-FF', 'aabb.ccdd.eeff', 'aabbccddeeff']:
+            self.assertEqual(mac_digits(text), 'AABBCCDDEEFF', text)
+
+    def test_partial_or_bad(self):
+        self.assertIsNone(mac_digits('aa:bb:cc'))
+        self.assertIsNone(mac_digits('gg:bb:cc:dd:ee:ff'))
+        self.assertIsNone(mac_digits('aa:bb:cc:dd:ee:ff:00'))
+
+
+class TextFilterTest(unittest.TestCase):
+
+    def test_prefix_and_post(self):
+        self.assertEqual(text_filter(['host', 'desc'], 'web01'),
+                         ('("web01*") ', '| search host=*web01* OR desc=*web01* '))
+
+    def test_extra_spelling(self):
+        base, post = text_filter(['mac'], 'aa:bb', extra='AA-BB')
+        self.assertEqual(base, '("aa:bb*" OR "AA-BB*") ')
+        self.assertEqual(post, '| search mac=*aa:bb* OR mac=*AA-BB* ')
+
+    def test_extra_same_spelling_is_skipped(self):
+        self.assertEqual(text_filter(['mac'], 'aa', extra='AA')[0], '("aa*") ')
+
+    def test_quotes_are_escaped(self):
+        self.assertEqual(text_filter(['host'], 'a"b')[0], '("a\\"b*") ')
+
+
+class UserFilterTest(unittest.TestCase):
+
+    def test_bare_name_keeps_suffix_match(self):
+        self.assertEqual(user_filter('user', 'smith'), ("user=*smith ", ""))
+
+    def test_domain_name_adds_the_term(self):
+        self.assertEqual(user_filter('user', 'corp\\jsmith'), ('"jsmith" user=*corp\\jsmith ', ""))
+
+    def test_wildcard_has_no_term(self):
+        self.assertEqual(user_filter('user', 'corp\\j*'), ("user=*corp\\j* ", ""))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,9 +4,6 @@
 ##################################################
 import sys
 import os
-from time import sleep
-import splunklib.results as results
-import splunklib.client as client
 from dotenv import load_dotenv
 import getpass
 import argparse
@@ -14,88 +11,165 @@ import re
 from rich.console import Console
 from rich.table import Table
 import socket
+from time import strftime, localtime
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 """
 This script was intended to be run from the bin, so it needs to add the /opt/splunkscripts directory to path
-to access all the libraries it needs, as well as the .env configuration file. Please note this is an example,
-and not necessarily how secure credentials should be handled.
+to access all the libraries it needs, as well as the .env configuration file. Set SPLUNKSCRIPTS_HOME to use a
+different directory. Please note this is an example, and not necessarily how secure credentials should be handled.
 """
 console = Console()
-os.chdir('/opt/splunkscripts')
+os.chdir(os.getenv('SPLUNKSCRIPTS_HOME', '/opt/splunkscripts'))
 current_dir = os.getcwd()
 sys.path.append(current_dir)
 fpath = os.getcwd()
 load_dotenv(os.path.join(fpath, '.env'))
+from splunkjobs import run_search, run_sliced_search, spl_head
+import splunkcache
+import splunkdaemon
+import splunkmetrics
+import splunkscheduler
+from splunkdedupe import dedupe
+from splunkoutput import FORMATS, RowWriter, take_stdout
+import splunkindex
+outputformat = 'table'
+useindex = True
+usermap = 'winuser'
+batchsize = int(os.getenv('SPLUNK_BATCH_SIZE', '250'))
+batchjobs = int(os.getenv('SPLUNK_BATCH_JOBS', '4'))
 
 def get_args():
     parser = argparse.ArgumentParser(
         description='This script searches your splunk windows logs for EventCode 4624 to attempt to map usernames to a computer name.')
     parser.add_argument('-s', '--search',required=False,type=str,default='None',action='store', help='Username to search?')
+    parser.add_argument('-b', '--batch-file',required=False,type=str,default=None,action='store', help='File of usernames to look up, one per line. Wildcards work like in -s.')
+    parser.add_argument('-l', '--limit',required=False,type=int,default=None,action='store', help='How many hosts should we print? The search stops early once it has this many.')
+    parser.add_argument('--no-cache',required=False,action='store_true', help='Skip the local result cache and run a fresh search.')
+    parser.add_argument('--no-index',required=False,action='store_true', help='Ignore the local user to host map and search splunk for the whole window.')
+    parser.add_argument('--sync',required=False,action='store_true', help='Pull the logons since the last sync into the local user to host map, then exit. Run it from cron.')
+    parser.add_argument('-f', '--format',required=False,type=str,default='table',choices=FORMATS, help="'table' draws the usual table. 'csv', 'tsv' and 'jsonl' write plain rows to stdout instead.")
+    parser.add_argument('--metrics',required=False,type=str,default=None,nargs='?',const='-', help='Time each phase of the run and print the timings and job stats as JSON to stderr, or append them to the given file.')
+    parser.add_argument('--slices',required=False,type=int,default=None,action='store', help='Split the 72h window into this many time slices and search them in parallel.')
     args = parser.parse_args()
     return args
 
 
 def build_service():
-    """Builds the service object using the client function after grabbing the necessary fields from a .env file."""
-    service = client.connect(host=os.getenv('SPLUNK_HOST'),
-                            port=os.getenv('SPLUNK_PORT'),
-                            scheme=os.getenv('SPLUNK_SCHEME'),
-                            username=os.getenv('SPLUNK_USER'),
-                            password=os.getenv('SPLUNK_PASS'))
-    return service
-
-
-def query_win_users(query):
-    """Uses the format_mac_windhcp to create a potential MAC to search which gets plugged into the searchquery_normal format line. The rest of the line is formatted with the original
-    query string in case it wasn't a MAC address originally passed. kwargs are added to do a normal search over the last 72hours. Stats are printed out to the console.log to let the
-    user know the status of their search. Logs are then extracted from the job and returned.
+    """Builds the service object after grabbing the necessary fields from a .env file. The session key is reused between
+    runs and every REST call shares a pool of keep-alive connections, see splunksession.py.
+    If splunkdaemon.py is running, the searches are handed to it instead, and splunklib never gets imported here."""
+    service = splunkdaemon.connect()
+    if service is not None:
+        return service
+    import splunksession
+    return splunksession.build_service()
+
+
+def read_batch_file(path):
+    """Reads usernames from a file, one per line. Blank lines, # comments and repeats are skipped."""
+    users = []
+    seen = set()
+    with open(path) as f:
+        for line in f:
+            user = line.split('#')[0].strip()
+            if user and user.lower() not in seen:
+                seen.add(user.lower())
+                users.append(user)
+    return users
+
+
+def build_user_query(users, limit=None, field='user'):
+    """Builds the 4624 search for one or more users, or hosts with field='host'. Splunk only sends back one row per
+    user and host, with the last time that user logged on there, most recent first.
     The index will need to be updated to be relevant to your splunk environment."""
+    if len(users) == 1:
+        userfilter = "{0}={1} ".format(field, users[0])
+    else:
+        userfilter = "{0} IN ({1}) ".format(field, ", ".join('"{0}"'.format(user) for user in users))
+    return 'search index=my_relevant_windows_index {0}EventCode=4624 app="win:local" | stats max(_time) as last_seen by host EventCode user | sort 0 - last_seen {1}'.format(userfilter, spl_head(limit))
+
+
+def query_win_users(users, limit=None, slices=None, kwargsearch=None, field='user'):
+    """Searches splunk for the users' logons, over the last 72 hours unless kwargsearch says otherwise. Stats are printed out to the console.log to let the
+    user know the status of their search. Logs are then extracted from the job and returned.
+    Long lists of users are split into searches of batchsize users, batchjobs of them running at once. With
+    field='host', users is a list of hosts, and the search finds who logged on to them instead."""
     console.log("[green] Searching Windows OS logs..")
-    searchquery_normal = 'search index=my_relevant_windows_index user={0} EventCode=4624 app="win:local" | table host EventCode user'.format(query)
-    kwargs_normalsearch = {'exec_mode': 'normal', 'earliest_time': '-72h', 'latest_time': 'now'}
-    job = service.jobs.create(searchquery_normal, **kwargs_normalsearch)
-    # A normal search returns the job's SID right away, so we need to poll for completion
-    while True:
-        while not job.is_ready():
-            pass
-        stats = {"isDone": job["isDone"],
-                 "doneProgress": float(job["doneProgress"])*100,
-                  "scanCount": int(job["scanCount"]),
-                  "eventCount": int(job["eventCount"]),
-                  "resultCount": int(job["resultCount"])}
-        console.log(f"[purple]{stats['doneProgress']}%   [blue]{stats['scanCount']} scanned   [yellow]{stats['eventCount']} matched   [green]{stats['resultCount']} results")
-        if stats["isDone"] == "1":
-            console.log("[blue]\n[!] Done!\n")
-            break
-        sleep(1)
-    logs = [x for x in results.ResultsReader(job.results())]
-    job.cancel()
+    kwargs_normalsearch = kwargsearch or {'exec_mode': 'normal', 'earliest_time': '-72h', 'latest_time': 'now'}
+    batches = [users[i:i+batchsize] for i in range(0, len(users), batchsize)]
+    if len(batches) == 1:
+        return run_sliced_search(service, build_user_query(users, limit, field), kwargs_normalsearch, slices, limit=limit)
+    logs = []
+    with ThreadPoolExecutor(max_workers=batchjobs) as pool:
+        futures = [pool.submit(run_sliced_search, service, build_user_query(batch, field=field), kwargs_normalsearch, slices,
+                               label="batch {0}/{1}".format(n + 1, len(batches))) for n, batch in enumerate(batches)]
+        for future in futures:
+            logs.extend(future.result())
     return logs
 
 
+def lookup_win_users(users, limit=None, slices=None, field='user'):
+    """Answers from the local user to host map up to its last sync, and only searches splunk for logons since then.
+    The splunk rows come first, so the newest logon per host wins the dedupe, which happens before the limit so hosts
+    in both don't count twice. Without a usable map, or with --no-index, the whole 72h is searched in splunk like
+    before. With more than one user, the rows are grouped by user. field='host' looks hosts up instead, and groups
+    by host."""
+    synced = splunkindex.checkpoint(usermap) if useindex else None
+    local = splunkindex.lookup_map(usermap, field, users) if synced is not None else None
+    if local is None:
+        logs = query_win_users(users, limit, slices, field=field)
+    else:
+        console.log("[green]{0} user to host pairs from the local map, searching splunk since its last sync {1:.0f}s ago..".format(
+            len(local), time.time() - synced))
+        for row in local:
+            row['EventCode'] = '4624'
+        newer = query_win_users(users, limit, kwargsearch={'exec_mode': 'normal', 'earliest_time': str(int(synced)), 'latest_time': 'now'},
+                                field=field)
+        logs = dedupe_win_logs(newer + local)
+    if len(users) > 1:
+        logs.sort(key=lambda u: str(u.get(field, '')).lower())
+    return logs[:limit] if limit else logs
+
+
+def sync_user_map():
+    """Pulls a summary of every logon since the last sync, one row per user and host, and merges it into the local
+    user to host map. The first sync covers the whole 72h."""
+    started = time.time()
+    kwargs_normalsearch = {'exec_mode': 'normal', 'earliest_time': str(splunkindex.sync_start(usermap)), 'latest_time': 'now'}
+    console.log("[yellow]Syncing the user to host map from {0}..".format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(kwargs_normalsearch['earliest_time'])))))
+    searchquery_normal = 'search index=my_relevant_windows_index EventCode=4624 app="win:local" user=* | stats min(_time) as first_seen max(_time) as last_seen by user host'
+    rows = run_search(service, searchquery_normal, kwargs_normalsearch, label='sync', use_cache=False)
+    merged = splunkindex.sync_map(usermap, ['user', 'host'], rows, started)
+    if merged is not None:
+        console.log("[green]{0} user to host pairs merged in {1:.1f}s.".format(merged, time.time() - started))
+
+
+@splunkmetrics.timed('dedupe')
 def dedupe_win_logs(logs):
-    """Dedupe by MAC address. """
-    macs = set()
-    nodupes = []
-    for x in logs:
-        if 'host' in x.keys():
-            y = tuple(sorted(x.items()))[1]
-            if y not in macs:
-                macs.add(y)
-                nodupes.append(x)
-    return nodupes
+    """Dedupe by user and host. Logs without a host are dropped. """
+    return dedupe(logs, ['user', 'host'], require=True)
 
 
+@splunkmetrics.timed('render')
 def pretty_windows_output(logs):
-    """Creates the pretty table, and prints it in green."""
+    """Creates the pretty table, and prints it in green. With a plain --format the rows are written to stdout instead."""
+    if outputformat != 'table':
+        writer = RowWriter(outputformat, ['user', 'host', 'EventCode', 'last_seen'])
+        writer.write(logs)
+        writer.close()
+        return
     if len(logs) != 0:
         try:
             table = Table(show_header=True, header_style="cyan", show_lines=True)
             table.add_column("User", justify="center")
             table.add_column("Host", justify="center")
             table.add_column("EventCode", justify="center")
+            table.add_column("Last seen", justify="center")
             for u in logs:
-                table.add_row(u['user'], u['host'], u['EventCode'])
+                last_seen = strftime('%Y-%m-%d %H:%M:%S', localtime(float(u['last_seen']))) if 'last_seen' in u else 'Missing.'
+                table.add_row(u['user'], u['host'], u['EventCode'], last_seen)
             console.print(table, style='green')
             print("\n")
         except:
@@ -108,13 +182,32 @@ def pretty_windows_output(logs):
 def main():
     try:
         args = get_args()
-        global service
-        service = build_service()
+        global service, outputformat, useindex
+        outputformat = args.format
+        if outputformat != 'table':
+            take_stdout()
+        if args.metrics:
+            splunkmetrics.enable()
+        with splunkmetrics.phase('login'):
+            service = build_service()
+        if args.no_cache:
+            splunkcache.disable()
+        if args.no_index:
+            useindex = False
+        if args.sync or args.batch_file:
+            splunkscheduler.set_priority('batch')
+        if args.sync:
+            sync_user_map()
+            console.log("[yellow][!] Done.")
+            exit()
+        users = read_batch_file(args.batch_file) if args.batch_file else [args.search]
         try:
-            pretty_windows_output(dedupe_win_logs(query_win_users(args.search)))
+            pretty_windows_output(dedupe_win_logs(lookup_win_users(users, args.limit, args.slices)))
         except:
             console.log("[red] No windows User logs were found.")
         console.log("[yellow][!] Done.")
+        if args.metrics:
+            splunkmetrics.write(args.metrics)
         exit()
     except KeyboardInterrupt:
         console.log("[red]\n[!!!] Ctrl + C Detected!")